@@ -0,0 +1,165 @@
+import subprocess
+from typing import List, Optional, Tuple, Union
+
+from pydub import AudioSegment
+from pydub.exceptions import CouldntEncodeError
+
+# Pausas (ms) entre repeticiones de una línea y entre líneas
+PAUSA_REPETICION = 1500
+PAUSA_LINEA = 2500
+# Formato de una pista sin clips (canales, frecuencia, bytes por muestra): el de edge-tts y gTTS
+DEFAULT_FORMAT = (1, 24000, 2)
+# Formato PCM crudo de ffmpeg según los bytes por muestra (pydub guarda 8 bits con signo)
+PCM_FORMATS = {1: "s8", 2: "s16le", 4: "s32le"}
+
+
+class TrackAssembler:
+    """Ensambla una pista a partir de clips y silencios en tiempo lineal.
+
+    Sumar AudioSegment con + copia todo el audio acumulado en cada paso, así que construir
+    una pista larga línea a línea es cuadrático. Aquí solo se guardan referencias a los clips
+    (un clip repetido no ocupa más memoria) y render() copia cada uno una sola vez en un
+    buffer PCM reservado de antemano, donde los silencios son simplemente bytes a cero.
+    """
+
+    def __init__(self):
+        self._parts: List[Union[AudioSegment, int]] = []
+
+    def add(self, segment: AudioSegment):
+        """Añadir un clip al final de la pista"""
+        self._parts.append(segment)
+
+    def add_silence(self, duration: int):
+        """Añadir un silencio de duration milisegundos"""
+        if duration > 0:
+            self._parts.append(duration)
+
+    def __bool__(self) -> bool:
+        return bool(self._parts)
+
+    def _format(self) -> Tuple[int, int, int]:
+        """Formato común de la pista (canales, frecuencia, bytes por muestra), como hace pydub al sumar"""
+        segments = [part for part in self._parts if isinstance(part, AudioSegment)]
+        if not segments:
+            return DEFAULT_FORMAT
+        return (
+            max(segment.channels for segment in segments),
+            max(segment.frame_rate for segment in segments),
+            max(segment.sample_width for segment in segments),
+        )
+
+    def render(self) -> AudioSegment:
+        """Construir la pista completa con una sola reserva de memoria"""
+        channels, frame_rate, sample_width = self._format()
+        frame_width = channels * sample_width
+
+        chunks = []
+        total = 0
+        for part in self._parts:
+            if isinstance(part, AudioSegment):
+                # set_* devuelve el mismo clip si ya tiene el formato de la pista
+                data = part.set_channels(channels).set_frame_rate(frame_rate).set_sample_width(sample_width).raw_data
+            else:
+                data = int(frame_rate * part / 1000) * frame_width
+            chunks.append(data)
+            total += data if isinstance(data, int) else len(data)
+
+        buffer = bytearray(total)
+        offset = 0
+        for data in chunks:
+            if isinstance(data, int):
+                # El buffer nace a cero: el silencio no se escribe
+                offset += data
+            else:
+                buffer[offset:offset + len(data)] = data
+                offset += len(data)
+
+        return AudioSegment(
+            data=buffer, sample_width=sample_width, frame_rate=frame_rate, channels=channels
+        )
+
+
+class StreamingTrackWriter:
+    """Codifica la pista a medida que se genera, enviando PCM a un único proceso ffmpeg.
+
+    A diferencia de TrackAssembler nunca existe la pista completa en memoria: cada clip se
+    escribe en cuanto se añade y los silencios se generan al vuelo, así que el pico de memoria
+    es el de un clip. El MP3 se escribe por tramas, por lo que si la ejecución se interrumpe
+    el archivo se puede reproducir hasta el último clip escrito.
+
+    El formato de la pista es el del primer clip; los siguientes se convierten a él.
+    """
+
+    def __init__(self, filename: str, format: str = "mp3"):
+        self.filename = filename
+        self.format = format
+        self.channels, self.frame_rate, self.sample_width = DEFAULT_FORMAT
+        self._process: Optional[subprocess.Popen] = None
+        self._pending_silence = 0
+
+    def _open(self, segment: Optional[AudioSegment]):
+        """Arrancar el codificador con el formato del primer clip"""
+        if segment is not None:
+            self.channels, self.frame_rate, self.sample_width = (
+                segment.channels, segment.frame_rate, segment.sample_width
+            )
+        command = [
+            AudioSegment.converter, "-y", "-loglevel", "error",
+            "-f", PCM_FORMATS[self.sample_width], "-ar", str(self.frame_rate), "-ac", str(self.channels),
+            "-i", "pipe:0",
+            "-f", self.format, self.filename,
+        ]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def _write(self, data: bytes):
+        try:
+            self._process.stdin.write(data)
+            # Cada clip llega a ffmpeg en cuanto se añade, sin esperar a llenar el buffer
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            # El codificador terminó antes de tiempo: close() informa del motivo
+            self.close()
+            raise
+
+    def _write_silence(self, duration: int):
+        frame_width = self.channels * self.sample_width
+        self._write(bytes(int(self.frame_rate * duration / 1000) * frame_width))
+
+    def add(self, segment: AudioSegment):
+        """Codificar un clip al final de la pista"""
+        if self._process is None:
+            self._open(segment)
+            if self._pending_silence:
+                self._write_silence(self._pending_silence)
+                self._pending_silence = 0
+        segment = segment.set_channels(self.channels).set_frame_rate(self.frame_rate).set_sample_width(self.sample_width)
+        self._write(segment.raw_data)
+
+    def add_silence(self, duration: int):
+        """Codificar un silencio de duration milisegundos"""
+        if duration <= 0:
+            return
+        if self._process is None:
+            # Sin clips todavía no se conoce el formato de la pista
+            self._pending_silence += duration
+        else:
+            self._write_silence(duration)
+
+    def close(self):
+        """Terminar de codificar y esperar a que el archivo quede completo"""
+        if self._process is None:
+            self._open(None)
+            if self._pending_silence:
+                self._write_silence(self._pending_silence)
+        if self._process.stdin.closed:
+            return
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        error = self._process.stderr.read()
+        if self._process.wait() != 0:
+            raise CouldntEncodeError(
+                f"Encoding failed. ffmpeg returned error code: {self._process.returncode}\n\n"
+                f"Output from ffmpeg:\n\n{error.decode(errors='ignore')}"
+            )
@@ -0,0 +1,164 @@
+import queue
+import sqlite3
+import threading
+import time
+import json
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Caché persistente de strokeorder.info: registros de caracteres y GIFs de trazos
+CACHE_DB_PATH = "character_cache.db"
+# Los registros se vuelven a consultar después de 30 días
+RECORD_TTL_SECONDS = 30 * 24 * 3600
+# Tamaño máximo total de los GIFs guardados; se eliminan primero los menos usados
+MAX_GIF_BYTES = 64 * 1024 * 1024
+# Conexiones del pool compartido por todos los hilos (Streamlit usa un hilo nuevo por ejecución)
+# y segundos de espera por una conexión libre o ante bloqueos de SQLite
+POOL_SIZE = 4
+POOL_TIMEOUT = 30.0
+
+
+class CharacterCache:
+    def __init__(self, db_path: str = CACHE_DB_PATH, ttl: float = RECORD_TTL_SECONDS, max_gif_bytes: int = MAX_GIF_BYTES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_gif_bytes = max_gif_bytes
+        self._pool = queue.Queue()
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        # Bytes de GIFs guardados, mantenidos al escribir en lugar de sumar la tabla en cada put_gif
+        self._gif_bytes = 0
+        self._gif_lock = threading.Lock()
+        self._init_database()
+
+    @contextmanager
+    def _connection(self):
+        """Usar una conexión del pool durante el bloque, creándola si aún no se llegó a POOL_SIZE"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                create = self._created < POOL_SIZE
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    conn = sqlite3.connect(self.db_path, timeout=POOL_TIMEOUT, isolation_level=None, check_same_thread=False)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                except BaseException:
+                    with self._pool_lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._pool.get(timeout=POOL_TIMEOUT)
+                except queue.Empty:
+                    raise sqlite3.OperationalError("No hay conexiones libres en el pool de la caché de caracteres")
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    def _init_database(self):
+        """Crear las tablas de la caché"""
+        with self._connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS characters (
+                    character TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS gifs (
+                    url TEXT PRIMARY KEY,
+                    content BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            ''')
+            # Orden de expulsión LRU y limpieza de registros expirados
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_gifs_accessed_at ON gifs (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_characters_fetched_at ON characters (fetched_at)")
+            conn.execute("DELETE FROM characters WHERE fetched_at < ?", (time.time() - self.ttl,))
+            self._gif_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM gifs").fetchone()[0]
+
+    def get_record(self, character: str) -> Optional[Dict]:
+        """Obtener el registro de un carácter, o None si no existe o expiró"""
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT data, fetched_at FROM characters WHERE character = ?", (character,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put_record(self, character: str, data: Dict):
+        """Guardar el registro de un carácter y eliminar los registros expirados"""
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO characters (character, data, fetched_at) VALUES (?, ?, ?)",
+                (character, json.dumps(data), now)
+            )
+            conn.execute("DELETE FROM characters WHERE fetched_at < ?", (now - self.ttl,))
+
+    def get_gif(self, url: str) -> Optional[bytes]:
+        """Obtener los bytes de un GIF y marcarlo como usado recientemente"""
+        with self._connection() as conn:
+            row = conn.execute("SELECT content FROM gifs WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE gifs SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        return row[0]
+
+    def put_gif(self, url: str, content: bytes):
+        """Guardar un GIF y expulsar los menos usados si se supera max_gif_bytes"""
+        with self._gif_lock, self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = conn.execute("SELECT size FROM gifs WHERE url = ?", (url,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO gifs (url, content, size, accessed_at) VALUES (?, ?, ?, ?)",
+                    (url, content, len(content), time.time())
+                )
+                total = self._gif_bytes - (previous[0] if previous else 0) + len(content)
+                if total > self.max_gif_bytes:
+                    # Recorrer del menos al más usado hasta liberar el exceso
+                    expired = []
+                    for old_url, size in conn.execute("SELECT url, size FROM gifs ORDER BY accessed_at"):
+                        if total <= self.max_gif_bytes:
+                            break
+                        expired.append((old_url,))
+                        total -= size
+                    conn.executemany("DELETE FROM gifs WHERE url = ?", expired)
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+                self._gif_bytes = total
+
+    def clear(self):
+        """Vaciar la caché"""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM characters")
+            conn.execute("DELETE FROM gifs")
+        with self._gif_lock:
+            self._gif_bytes = 0
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_character_cache() -> CharacterCache:
+    """Instancia de CharacterCache compartida por todo el proceso (segura entre hilos)"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CharacterCache()
+        return _default_cache
@@ -0,0 +1,544 @@
+import asyncio
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import quote
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from character_cache import get_character_cache
+from character_store import get_character_store
+from static_assets import asset_available, publish_asset
+
+# Cliente único de datos de caracteres: base local de trazos, caché persistente y strokeorder.info
+STROKEORDER_URL = "http://www.strokeorder.info"
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+# (conexión, lectura) en segundos
+REQUEST_TIMEOUT = (5, 10)
+# Reintentos ante errores de conexión y respuestas 429/5xx, con espera exponencial
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Conexiones abiertas y consultas simultáneas hacia strokeorder.info
+POOL_SIZE = 8
+MAX_WORKERS = 8
+# Precarga en segundo plano: hilos dedicados, caracteres en espera como máximo
+# y caracteres recordados como ya encolados
+PREFETCH_WORKERS = 2
+PREFETCH_MAX_QUEUED = 32
+PREFETCH_MAX_TRACKED = 2000
+# Motor asíncrono (análisis de texto): concurrencia inicial y máxima, y límite por servidor
+ASYNC_INITIAL_CONCURRENCY = 4
+ASYNC_MAX_CONCURRENCY = 16
+ASYNC_PER_HOST_LIMIT = 8
+# Resultados recientes compartidos entre sesiones (solo texto y URL), tamaño aproximado máximo
+RESULT_CACHE_MAX_BYTES = 4 * 1024 * 1024
+# Segundos que se recuerda un carácter sin animación (error de red o página sin GIF) antes de reintentarlo
+NEGATIVE_RESULT_TTL = 300
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Sesión HTTP compartida por todo el proceso (keep-alive, pool de conexiones y reintentos)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=RETRY_BACKOFF,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=("GET",)
+            )
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.headers['User-Agent'] = USER_AGENT
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def fetch_character_data(character: str) -> Dict:
+    """Obtener datos de un carácter chino (registro y animación de trazos).
+
+    Se consulta primero la base de datos local de trazos (sin red); solo los caracteres
+    que no están en ella se buscan en strokeorder.info, a través de la caché persistente.
+    """
+    local = _local_result(character)
+    if local is not None:
+        return local
+    
+    cache = get_character_cache()
+    
+    data = cache.get_record(character)
+    if data is None:
+        data = scrape_character_data(character)
+        if not data['success']:
+            # Los errores de red no se guardan en disco; en memoria solo por NEGATIVE_RESULT_TTL
+            return _remember(character, {**data, 'image_url': None})
+        cache.put_record(character, data)
+    
+    content = None
+    if data['gif_url']:
+        content = cache.get_gif(data['gif_url'])
+        if content is None:
+            content = download_gif(data['gif_url'])
+            if content:
+                cache.put_gif(data['gif_url'], content)
+    
+    return _remember(character, _gif_result(data, content))
+
+
+class ResultCache:
+    """Resultados de caracteres compartidos por todas las sesiones, acotados en memoria con expulsión LRU.
+
+    Solo guarda texto y la URL de la animación (los bytes viven en static/), de modo que una sesión
+    puede conservar únicamente los caracteres y volver a resolverlos aquí en cada ejecución.
+    Las entradas con ttl (resultados negativos) dejan de devolverse cuando caducan.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(character: str, data: Dict) -> int:
+        """Tamaño aproximado en memoria de una entrada"""
+        return sys.getsizeof(character) + sys.getsizeof(data) + sum(
+            sys.getsizeof(key) + sys.getsizeof(value) for key, value in data.items()
+        )
+
+    def get(self, character: str) -> Optional[Dict]:
+        """Obtener el resultado de un carácter, o None si no está o su animación ya no existe"""
+        with self._lock:
+            entry = self._entries.get(character)
+            if entry is None:
+                return None
+            self._entries.move_to_end(character)
+        data, size, expires_at = entry
+        if (expires_at is not None and time.time() > expires_at) or (
+            data['image_url'] and not asset_available(data['image_url'])
+        ):
+            with self._lock:
+                if self._entries.get(character) is entry:
+                    del self._entries[character]
+                    self.total_bytes -= size
+            return None
+        return dict(data)
+
+    def put(self, character: str, data: Dict, ttl: Optional[float] = None):
+        """Guardar un resultado (durante ttl segundos, si se indica) y expulsar los menos usados si se supera max_bytes"""
+        entry = (dict(data), self._size(character, data), time.time() + ttl if ttl is not None else None)
+        with self._lock:
+            previous = self._entries.pop(character, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self._entries[character] = entry
+            self.total_bytes += entry[1]
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, size, _) = self._entries.popitem(last=False)
+                self.total_bytes -= size
+
+    def usage(self) -> Dict:
+        """Entradas y bytes aproximados ocupados, y el máximo permitido"""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.total_bytes, 'max_bytes': self.max_bytes}
+
+
+_result_cache = ResultCache()
+
+
+def get_result_cache() -> ResultCache:
+    """Instancia de ResultCache compartida por todo el proceso"""
+    return _result_cache
+
+
+def _remember(character: str, data: Dict) -> Dict:
+    """Guardar un resultado en la caché compartida; los que no tienen animación, solo por NEGATIVE_RESULT_TTL"""
+    if data['success'] and data['image_url']:
+        _result_cache.put(character, data)
+    else:
+        _result_cache.put(character, data, ttl=NEGATIVE_RESULT_TTL)
+    return data
+
+
+def _local_result(character: str) -> Optional[Dict]:
+    """Datos del carácter sin usar la red: caché compartida en memoria o base local de trazos"""
+    data = _result_cache.get(character)
+    if data is not None:
+        return data
+    offline = _offline_result(character)
+    if offline is not None:
+        _remember(character, offline)
+    return offline
+
+
+def _offline_result(character: str) -> Optional[Dict]:
+    """Datos del carácter desde la base local de trazos, o None si no está"""
+    offline = get_character_store().lookup(character)
+    if offline is None or not offline['svg']:
+        return None
+    svg = offline.pop('svg')
+    return {**offline, 'image_url': publish_asset(svg.encode('utf-8'), 'svg')}
+
+
+def _gif_result(data: Dict, content: Optional[bytes]) -> Dict:
+    """Combinar un registro de strokeorder.info con la URL estática de su GIF"""
+    return {**data, 'image_url': publish_asset(content, 'gif') if content else None}
+
+
+def _cached_result(character: str) -> Optional[Dict]:
+    """Datos del carácter desde la caché persistente de strokeorder.info, sin usar la red"""
+    cache = get_character_cache()
+    data = cache.get_record(character)
+    if data is None:
+        return None
+    content = cache.get_gif(data['gif_url']) if data['gif_url'] else None
+    return _remember(character, _gif_result(data, content))
+
+
+def lookup_characters(characters: Iterable[str]) -> Dict[str, Dict]:
+    """Resolver varios caracteres solo con fuentes locales, para dibujarlos sin esperar a la red.
+
+    Se consultan la caché compartida en memoria, la base local de trazos y la caché persistente;
+    los caracteres que no están en ninguna se devuelven como no disponibles.
+    """
+    results = {}
+    for character in dict.fromkeys(characters):
+        data = _local_result(character) or _cached_result(character)
+        results[character] = data or {'success': False, 'error': "Sin datos locales", 'image_url': None}
+    return results
+
+
+_fetch_executor = None
+_fetch_executor_lock = threading.Lock()
+
+
+def get_fetch_executor() -> ThreadPoolExecutor:
+    """Pool de hilos de las consultas en primer plano, compartido por todo el proceso"""
+    global _fetch_executor
+    with _fetch_executor_lock:
+        if _fetch_executor is None:
+            _fetch_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fetch")
+        return _fetch_executor
+
+
+def fetch_characters(characters: Iterable[str]) -> Dict[str, Dict]:
+    """Obtener los datos de varios caracteres en un solo lote paralelo.
+
+    Devuelve un diccionario carácter -> datos; los caracteres repetidos se consultan una vez.
+    """
+    unique_chars = list(dict.fromkeys(characters))
+    results = {}
+    missing = []
+    for character in unique_chars:
+        data = _result_cache.get(character)
+        if data is None:
+            missing.append(character)
+        else:
+            results[character] = data
+    if not missing:
+        return results
+    
+    prefetcher = get_prefetcher()
+    
+    def fetch(character):
+        try:
+            # Si la precarga ya está consultando este carácter, esperar a que termine y leer la caché;
+            # si solo está encolado, se cancela y se consulta aquí
+            prefetcher.wait(character)
+            return fetch_character_data(character)
+        except Exception as exc:
+            return {'success': False, 'error': str(exc), 'image_url': None}
+    
+    results.update(zip(missing, get_fetch_executor().map(fetch, missing)))
+    return {character: results[character] for character in unique_chars}
+
+
+class CharacterPrefetcher:
+    """Calienta la caché de caracteres en segundo plano con un pool de hilos acotado.
+
+    La cola también está acotada: al superar max_queued se descartan las precargas más
+    antiguas que aún no empezaron, que corresponden a palabras ya pasadas.
+    """
+
+    def __init__(self, max_workers: int = PREFETCH_WORKERS, max_queued: int = PREFETCH_MAX_QUEUED,
+                 max_tracked: int = PREFETCH_MAX_TRACKED):
+        self.max_queued = max_queued
+        self.max_tracked = max_tracked
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._submitted = set()
+        self._pending = {}
+
+    def prefetch(self, characters: Iterable[str]):
+        """Encolar los caracteres que aún no se han precargado; no bloquea"""
+        for character in dict.fromkeys(characters):
+            with self._lock:
+                if character in self._submitted:
+                    continue
+                if len(self._submitted) >= self.max_tracked:
+                    self._submitted.clear()
+                if len(self._pending) >= self.max_queued:
+                    self._drop_oldest()
+                self._submitted.add(character)
+                self._pending[character] = self._executor.submit(self._warm, character)
+
+    def _drop_oldest(self):
+        """Cancelar la precarga en espera más antigua (con self._lock tomado)"""
+        for character, future in self._pending.items():
+            if future.cancel():
+                del self._pending[character]
+                self._submitted.discard(character)
+                return
+
+    def wait(self, character: str):
+        """Preparar la consulta en primer plano de un carácter.
+
+        Si su precarga aún está en la cola se cancela (quien llama lo consulta directamente,
+        sin esperar a los caracteres encolados antes); si ya está en curso, se espera a que termine.
+        """
+        with self._lock:
+            future = self._pending.get(character)
+            if future is None:
+                return
+            if future.cancel():
+                del self._pending[character]
+                self._submitted.discard(character)
+                return
+        future.result()
+
+    def _warm(self, character: str):
+        try:
+            data = fetch_character_data(character)
+        except Exception:
+            data = {'success': False}
+        with self._lock:
+            self._pending.pop(character, None)
+            if not data['success']:
+                # Permitir un nuevo intento en la próxima precarga
+                self._submitted.discard(character)
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> CharacterPrefetcher:
+    """Instancia de CharacterPrefetcher compartida por todo el proceso"""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = CharacterPrefetcher()
+        return _prefetcher
+
+
+class AdaptiveLimiter:
+    """Límite de concurrencia adaptativo: sube de uno en uno con cada éxito y se reduce a la mitad ante un error"""
+
+    def __init__(self, initial: int = ASYNC_INITIAL_CONCURRENCY, maximum: int = ASYNC_MAX_CONCURRENCY):
+        self.limit = initial
+        self.maximum = maximum
+        self._active = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def success(self):
+        self.limit = min(self.maximum, self.limit + 1)
+
+    def failure(self):
+        self.limit = max(1, self.limit // 2)
+
+
+async def _async_get(session: aiohttp.ClientSession, limiter: AdaptiveLimiter, url: str, as_text: bool = False):
+    """GET con reintentos: espera exponencial (o Retry-After) ante errores de conexión y 429/5xx"""
+    for attempt in range(MAX_RETRIES + 1):
+        retry_after = None
+        async with limiter:
+            try:
+                async with session.get(url) as response:
+                    if response.status in RETRY_STATUSES:
+                        retry_after = response.headers.get('Retry-After')
+                    response.raise_for_status()
+                    body = await (response.text() if as_text else response.read())
+                limiter.success()
+                return body
+            except aiohttp.ClientResponseError as e:
+                if e.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    raise
+                limiter.failure()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                limiter.failure()
+                if attempt == MAX_RETRIES:
+                    raise
+        
+        delay = RETRY_BACKOFF * 2 ** attempt * (1 + random.random())
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        await asyncio.sleep(delay)
+
+
+async def _async_fetch_character(session: aiohttp.ClientSession, limiter: AdaptiveLimiter, character: str):
+    """Versión asíncrona de fetch_character_data para caracteres fuera de la base local"""
+    cache = get_character_cache()
+    
+    data = cache.get_record(character)
+    if data is None:
+        try:
+            html = await _async_get(session, limiter, character_url(character), as_text=True)
+        except Exception as e:
+            # Los errores de red no se guardan en disco; en memoria solo por NEGATIVE_RESULT_TTL
+            return character, _remember(character, {'success': False, 'error': str(e), 'image_url': None})
+        data = parse_character_page(html)
+        cache.put_record(character, data)
+    
+    content = None
+    if data['gif_url']:
+        content = cache.get_gif(data['gif_url'])
+        if content is None:
+            try:
+                content = await _async_get(session, limiter, data['gif_url'])
+                cache.put_gif(data['gif_url'], content)
+            except Exception:
+                content = None
+    
+    return character, _remember(character, _gif_result(data, content))
+
+
+async def fetch_characters_async(
+    characters: Iterable[str],
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    result_callback: Optional[Callable[[str, Dict], None]] = None,
+    max_concurrency: int = ASYNC_MAX_CONCURRENCY,
+    per_host_limit: int = ASYNC_PER_HOST_LIMIT
+) -> Dict[str, Dict]:
+    """Obtener los datos de muchos caracteres con un solo pool de conexiones asíncrono.
+
+    Los caracteres ya conocidos o de la base local se resuelven sin red; el resto se consulta con concurrencia
+    adaptativa. Tras cada carácter, result_callback recibe (carácter, datos) en el orden en que
+    llegan y progress_callback recibe (caracteres terminados, total).
+    """
+    unique_chars = list(dict.fromkeys(characters))
+    total = len(unique_chars)
+    results = {}
+    
+    pending = []
+    for character in unique_chars:
+        local = _local_result(character)
+        if local is None:
+            pending.append(character)
+        else:
+            results[character] = local
+            if result_callback:
+                result_callback(character, local)
+    if progress_callback:
+        progress_callback(len(results), total)
+    
+    if pending:
+        limiter = AdaptiveLimiter(min(ASYNC_INITIAL_CONCURRENCY, max_concurrency), max_concurrency)
+        connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=per_host_limit)
+        timeout = aiohttp.ClientTimeout(sock_connect=REQUEST_TIMEOUT[0], sock_read=REQUEST_TIMEOUT[1])
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers={'User-Agent': USER_AGENT}) as session:
+            tasks = [_async_fetch_character(session, limiter, character) for character in pending]
+            for task in asyncio.as_completed(tasks):
+                character, data = await task
+                results[character] = data
+                if result_callback:
+                    result_callback(character, data)
+                if progress_callback:
+                    progress_callback(len(results), total)
+    
+    return results
+
+
+def fetch_characters_with_progress(
+    characters: Iterable[str],
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    result_callback: Optional[Callable[[str, Dict], None]] = None
+) -> Dict[str, Dict]:
+    """Versión síncrona de fetch_characters_async, para llamarla desde el script de Streamlit"""
+    return asyncio.run(fetch_characters_async(characters, progress_callback, result_callback))
+
+
+def character_url(character: str) -> str:
+    """URL de la página de un carácter en strokeorder.info"""
+    return f"{STROKEORDER_URL}/mandarin.php?q={quote(character)}"
+
+
+def scrape_character_data(character: str) -> Dict:
+    """Consultar strokeorder.info y extraer pinyin, definición, trazos, radical y URL del GIF"""
+    try:
+        response = get_session().get(character_url(character), timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return parse_character_page(response.text)
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def parse_character_page(html: str) -> Dict:
+    """Extraer los datos de un carácter del HTML de strokeorder.info"""
+    # Extraer información
+    pinyin_match = re.search(r'Pinyin & Definition:.*?<[^>]*>([^<]+)', html, re.DOTALL)
+    pinyin = pinyin_match.group(1).strip() if pinyin_match else "N/A"
+    
+    definition_match = re.search(r'Pinyin & Definition:.*?<[^>]*>[^<]+.*?<[^>]*>([^<]+)', html, re.DOTALL)
+    definition = definition_match.group(1).strip() if definition_match else "N/A"
+
+    gif_match = re.search(r'src="([^"]*\.gif[^"]*)"', html)
+    gif_url = None
+    
+    if gif_match:
+        gif_url = gif_match.group(1)
+        if gif_url.startswith('/'):
+            gif_url = STROKEORDER_URL + gif_url
+        elif not gif_url.startswith('http'):
+            gif_url = STROKEORDER_URL + '/' + gif_url
+    
+    strokes_match = re.search(r'Strokes:.*?(\d+)', html, re.DOTALL)
+    strokes = strokes_match.group(1) if strokes_match else "N/A"
+    
+    radical_match = re.search(r'Radical:.*?<[^>]*>([^<]+)', html, re.DOTALL)
+    radical = radical_match.group(1).strip() if radical_match else "N/A"
+    
+    return {
+        'gif_url': gif_url,
+        'pinyin': pinyin,
+        'definition': definition,
+        'strokes': strokes,
+        'radical': radical,
+        'success': True
+    }
+
+
+def download_gif(gif_url: str):
+    """Descargar un GIF de trazos; devuelve los bytes o None si falla"""
+    try:
+        response = get_session().get(gif_url, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    except Exception:
+        return None
@@ -0,0 +1,208 @@
+import argparse
+import json
+import math
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterator, List, Optional
+
+# Base de datos local de caracteres (pinyin, definición, trazos, radical y SVG animado),
+# construida a partir del conjunto de datos Make Me a Hanzi (dictionary.txt y graphics.txt)
+STORE_DB_PATH = "character_store.db"
+
+# Animación del SVG: segundos por trazo y pausa antes de repetir
+STROKE_SECONDS = 0.6
+LOOP_PAUSE_SECONDS = 1.5
+
+
+class CharacterStore:
+    def __init__(self, db_path: str = STORE_DB_PATH):
+        self.db_path = db_path
+        # Una sola conexión de solo lectura compartida por todos los hilos: Streamlit usa un hilo
+        # nuevo en cada ejecución, así que una conexión por hilo duraría una sola ejecución
+        self._conn = None
+        self._conn_lock = threading.Lock()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Obtener la conexión de solo lectura compartida, o None si no hay base de datos"""
+        with self._conn_lock:
+            if self._conn is None:
+                if not os.path.exists(self.db_path):
+                    return None
+                self._conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            return self._conn
+
+    def available(self) -> bool:
+        """Indicar si la base de datos local existe"""
+        return os.path.exists(self.db_path)
+
+    def lookup(self, character: str) -> Optional[Dict]:
+        """Buscar un carácter; devuelve el registro con el SVG de trazos, o None si no está"""
+        conn = self._connect()
+        if conn is None:
+            return None
+        row = conn.execute(
+            "SELECT pinyin, definition, strokes, radical, svg FROM characters WHERE character = ?",
+            (character,)
+        ).fetchone()
+        if row is None:
+            return None
+        pinyin, definition, strokes, radical, svg = row
+        return {
+            'gif_url': None,
+            'svg': zlib.decompress(svg).decode('utf-8') if svg else None,
+            'pinyin': pinyin or "N/A",
+            'definition': definition or "N/A",
+            'strokes': str(strokes) if strokes else "N/A",
+            'radical': radical or "N/A",
+            'success': True
+        }
+
+
+def _read_json_lines(path: str) -> Iterator[Dict]:
+    """Leer un archivo con un objeto JSON por línea"""
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _median_length(median: List[List[float]]) -> float:
+    """Longitud de la línea media de un trazo"""
+    return sum(math.dist(a, b) for a, b in zip(median, median[1:]))
+
+
+def render_stroke_svg(strokes: List[str], medians: List[List[List[float]]]) -> str:
+    """Generar un SVG que dibuja los trazos en orden, en bucle.
+
+    Cada trazo se recorta con su contorno y se "pinta" animando stroke-dashoffset
+    sobre su línea media, igual que la animación GIF de strokeorder.info.
+    """
+    count = len(strokes)
+    cycle = count * STROKE_SECONDS + LOOP_PAUSE_SECONDS
+    styles = []
+    clips = []
+    outlines = []
+    paints = []
+
+    for i, (stroke, median) in enumerate(zip(strokes, medians)):
+        length = math.ceil(_median_length(median)) + 1
+        start = i * STROKE_SECONDS / cycle * 100
+        end = (i + 1) * STROKE_SECONDS / cycle * 100
+        points = " ".join(f"{x} {y}" for x, y in median)
+
+        styles.append(
+            f"@keyframes s{i}{{0%,{start:.2f}%{{stroke-dashoffset:{length}}}"
+            f"{end:.2f}%,100%{{stroke-dashoffset:0}}}}"
+            f".s{i}{{stroke-dasharray:{length};animation:s{i} {cycle:.2f}s linear infinite}}"
+        )
+        clips.append(f'<clipPath id="c{i}"><path d="{stroke}"/></clipPath>')
+        outlines.append(f'<path d="{stroke}"/>')
+        paints.append(f'<path class="s{i}" clip-path="url(#c{i})" d="M{points}"/>')
+
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1024 1024" width="256" height="256">'
+        f'<style>{"".join(styles)}</style>'
+        f'<defs>{"".join(clips)}</defs>'
+        '<g transform="scale(1,-1) translate(0,-900)">'
+        f'<g fill="#ddd">{"".join(outlines)}</g>'
+        f'<g fill="none" stroke="#000" stroke-width="128" stroke-linecap="round">{"".join(paints)}</g>'
+        '</g></svg>'
+    )
+
+
+def build_store(dictionary_path: str, graphics_path: str, db_path: str = STORE_DB_PATH) -> int:
+    """Construir la base de datos local a partir de dictionary.txt y graphics.txt.
+
+    Devuelve la cantidad de caracteres importados.
+    """
+    graphics = {}
+    for entry in _read_json_lines(graphics_path):
+        graphics[entry['character']] = entry
+
+    rows = []
+    for entry in _read_json_lines(dictionary_path):
+        character = entry['character']
+        graphic = graphics.get(character)
+        svg = None
+        strokes = None
+        if graphic:
+            strokes = len(graphic['strokes'])
+            svg = zlib.compress(render_stroke_svg(graphic['strokes'], graphic['medians']).encode('utf-8'), 9)
+        rows.append((
+            character,
+            ", ".join(entry.get('pinyin') or []),
+            entry.get('definition'),
+            strokes,
+            entry.get('radical'),
+            svg
+        ))
+
+    # Construir en un archivo temporal y reemplazar al final: los lectores nunca ven una base a medias
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('''
+        CREATE TABLE characters (
+            character TEXT PRIMARY KEY,
+            pinyin TEXT,
+            definition TEXT,
+            strokes INTEGER,
+            radical TEXT,
+            svg BLOB
+        ) WITHOUT ROWID
+    ''')
+    conn.executemany("INSERT OR REPLACE INTO characters VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return len(rows)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_character_store() -> CharacterStore:
+    """Instancia de CharacterStore compartida por todo el proceso"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = CharacterStore()
+        return _default_store
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Build the offline stroke-order character store.")
+    parser.add_argument(
+        "--dictionary", type=str, default="dictionary.txt",
+        help="Path to Make Me a Hanzi dictionary.txt"
+    )
+    parser.add_argument(
+        "--graphics", type=str, default="graphics.txt",
+        help="Path to Make Me a Hanzi graphics.txt"
+    )
+    parser.add_argument(
+        "--output", type=str, default=STORE_DB_PATH,
+        help="Output SQLite database"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    for path in (args.dictionary, args.graphics):
+        if not os.path.exists(path):
+            print(f"Error: Input file '{path}' does not exist.")
+            exit(1)
+
+    count = build_store(args.dictionary, args.graphics, args.output)
+    print(f"✓ {count} caracteres importados en '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
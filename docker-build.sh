@@ -1,7 +1,7 @@
 #!/bin/bash
 
-# Build the Docker image
-docker build -t mandarin-flashcards .
+# Build the Docker image (MAKEMEAHANZI_COMMIT pins the character store data; default: master)
+docker build --build-arg MAKEMEAHANZI_COMMIT="${MAKEMEAHANZI_COMMIT:-master}" -t mandarin-flashcards .
 
 # Run the container
 docker run -p 8502:8502 mandarin-flashcards
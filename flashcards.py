@@ -1,15 +1,22 @@
 import streamlit as st
+import streamlit.components.v1 as components
+from streamlit.errors import StreamlitAPIException
 import sqlite3
 import pandas as pd
 import random
 import time
 import hashlib
 import io
+import csv
+import os
 from typing import Dict, List, Optional, Tuple
-import requests
-import re
-from urllib.parse import quote
-import base64
+import json
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+from character_data import fetch_characters, fetch_characters_with_progress, get_prefetcher, lookup_characters
+from font_subset import SUBSET_LOG_PATH, get_font_subset_job, missing_characters
 
 # Configuración de la página
 st.set_page_config(
@@ -19,171 +26,402 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+logger = logging.getLogger(__name__)
+
 # Código de acceso (hash SHA-256 de ".Ad3l4nT3$$$$$")
 ACCESS_CODE_HASH = "32b1514b28d7aa1aba3cdecbcfe3e370e3afcedd4b9fee1199f2801cc38cfe22"
 
+# Conexiones SQLite: espera máxima ante bloqueos, tamaño de la caché de sentencias preparadas
+# y conexiones del pool compartido por todas las sesiones
+SQLITE_BUSY_TIMEOUT = 30.0
+SQLITE_CACHED_STATEMENTS = 256
+SQLITE_POOL_SIZE = 4
+
+# Vocabulario inicial para bases de datos vacías
+DEFAULT_VOCABULARY = [
+    # Saludos y Cortesía
+    ('你好', 'nǐ hǎo', 'Hola', 'Saludos y Cortesía'),
+    ('再见', 'zài jiàn', 'Adiós', 'Saludos y Cortesía'),
+    ('谢谢', 'xiè xie', 'Gracias', 'Saludos y Cortesía'),
+    ('请', 'qǐng', 'Por favor', 'Saludos y Cortesía'),
+    ('对不起', 'duì bu qǐ', 'Lo siento', 'Saludos y Cortesía'),
+    ('没关系', 'méi guān xi', 'No importa', 'Saludos y Cortesía'),
+    ('欢迎', 'huān yíng', 'Bienvenido', 'Saludos y Cortesía'),
+
+    # Números
+    ('一', 'yī', 'Uno', 'Números'),
+    ('二', 'èr', 'Dos', 'Números'),
+    ('三', 'sān', 'Tres', 'Números'),
+    ('四', 'sì', 'Cuatro', 'Números'),
+    ('五', 'wǔ', 'Cinco', 'Números'),
+    ('六', 'liù', 'Seis', 'Números'),
+    ('七', 'qī', 'Siete', 'Números'),
+    ('八', 'bā', 'Ocho', 'Números'),
+    ('九', 'jiǔ', 'Nueve', 'Números'),
+    ('十', 'shí', 'Diez', 'Números'),
+
+    # Familia
+    ('爸爸', 'bà ba', 'Papá', 'Familia'),
+    ('妈妈', 'mā ma', 'Mamá', 'Familia'),
+    ('儿子', 'ér zi', 'Hijo', 'Familia'),
+    ('女儿', 'nǚ ér', 'Hija', 'Familia'),
+    ('哥哥', 'gē ge', 'Hermano mayor', 'Familia'),
+    ('姐姐', 'jiě jie', 'Hermana mayor', 'Familia'),
+    ('弟弟', 'dì di', 'Hermano menor', 'Familia'),
+    ('妹妹', 'mèi mei', 'Hermana menor', 'Familia'),
+
+    # Aula
+    ('老师', 'lǎo shī', 'Profesor/a', 'Aula'),
+    ('学生', 'xué sheng', 'Estudiante', 'Aula'),
+    ('问题', 'wèn tí', 'Pregunta', 'Aula'),
+    ('答案', 'dá àn', 'Respuesta', 'Aula'),
+    ('汉语', 'hàn yǔ', 'Chino (idioma)', 'Aula'),
+    ('明白', 'míng bai', 'Entender', 'Aula'),
+    ('说', 'shuō', 'Hablar/Decir', 'Aula'),
+    ('听', 'tīng', 'Escuchar', 'Aula'),
+
+    # Colores
+    ('红色', 'hóng sè', 'Rojo', 'Colores'),
+    ('蓝色', 'lán sè', 'Azul', 'Colores'),
+    ('绿色', 'lǜ sè', 'Verde', 'Colores'),
+    ('黄色', 'huáng sè', 'Amarillo', 'Colores'),
+    ('黑色', 'hēi sè', 'Negro', 'Colores'),
+    ('白色', 'bái sè', 'Blanco', 'Colores'),
+    ('紫色', 'zǐ sè', 'Morado', 'Colores'),
+
+    # Tiempo
+    ('今天', 'jīn tiān', 'Hoy', 'Tiempo'),
+    ('明天', 'míng tiān', 'Mañana', 'Tiempo'),
+    ('昨天', 'zuó tiān', 'Ayer', 'Tiempo'),
+    ('现在', 'xiàn zài', 'Ahora', 'Tiempo'),
+    ('早上', 'zǎo shang', 'Mañana (AM)', 'Tiempo'),
+    ('晚上', 'wǎn shang', 'Noche', 'Tiempo'),
+    ('年', 'nián', 'Año', 'Tiempo'),
+    ('月', 'yuè', 'Mes', 'Tiempo'),
+    ('天', 'tiān', 'Día', 'Tiempo'),
+]
+
+
+def _migration_base_schema(cursor: sqlite3.Cursor):
+    """Tablas vocabulary y config, incluyendo columnas agregadas en versiones antiguas"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vocabulary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chinese TEXT NOT NULL,
+            pinyin TEXT NOT NULL,
+            spanish TEXT NOT NULL,
+            category TEXT NOT NULL,
+            needs_review BOOLEAN DEFAULT 0,
+            archived BOOLEAN DEFAULT 0,
+            explanation TEXT,
+            literal_translation TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Bases de datos creadas antes de estas columnas no las tienen
+    cursor.execute("PRAGMA table_info(vocabulary)")
+    columns = [column[1] for column in cursor.fetchall()]
+    
+    if 'needs_review' not in columns:
+        cursor.execute('ALTER TABLE vocabulary ADD COLUMN needs_review BOOLEAN DEFAULT 0')
+    
+    if 'archived' not in columns:
+        cursor.execute('ALTER TABLE vocabulary ADD COLUMN archived BOOLEAN DEFAULT 0')
+
+    if 'explanation' not in columns:
+        cursor.execute('ALTER TABLE vocabulary ADD COLUMN explanation TEXT')
+        
+    if 'literal_translation' not in columns:
+        cursor.execute('ALTER TABLE vocabulary ADD COLUMN literal_translation TEXT')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS config (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+
+def _migration_seed_vocabulary(cursor: sqlite3.Cursor):
+    """Insertar el vocabulario por defecto si la tabla está vacía"""
+    cursor.execute("SELECT COUNT(*) FROM vocabulary")
+    if cursor.fetchone()[0] == 0:
+        cursor.executemany('''
+            INSERT INTO vocabulary (chinese, pinyin, spanish, category)
+            VALUES (?, ?, ?, ?)
+        ''', DEFAULT_VOCABULARY)
+
+def _migration_query_indexes(cursor: sqlite3.Cursor):
+    """Índices para los filtros de categoría, repaso, archivado y búsqueda por palabra"""
+    # Filtros y conteos por categoría; también cubre SELECT DISTINCT category
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_vocabulary_category
+        ON vocabulary (category, archived, needs_review)
+    ''')
+    # Filtros sobre "Todas las categorías"
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_vocabulary_archived
+        ON vocabulary (archived, needs_review)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_vocabulary_review
+        ON vocabulary (needs_review, archived)
+    ''')
+    # Toggles y estados de repaso/archivado
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_vocabulary_word
+        ON vocabulary (chinese, pinyin)
+    ''')
+    cursor.execute("ANALYZE vocabulary")
+
+def _join_distinct(values: List[Optional[str]], separator: str) -> Optional[str]:
+    """Unir los textos distintos y no vacíos de values en su orden; si no hay ninguno, devolver el primero"""
+    distinct = list(dict.fromkeys(value.strip() for value in values if value and value.strip()))
+    return separator.join(distinct) if distinct else values[0]
+
+def _migration_unique_words(cursor: sqlite3.Cursor):
+    """Unir las filas repetidas y exigir una sola fila por (chinese, pinyin, category).
+
+    Se conserva la fila más antigua de cada grupo. Las copias idénticas se eliminan; si las
+    copias difieren, sus traducciones y explicaciones distintas se unen en la fila conservada,
+    así la migración no pierde datos.
+    """
+    groups = cursor.execute('''
+        SELECT chinese, pinyin, category FROM vocabulary
+        GROUP BY chinese, pinyin, category
+        HAVING COUNT(*) > 1
+    ''').fetchall()
+    merged = 0
+    for group in groups:
+        rows = cursor.execute('''
+            SELECT id, spanish, explanation, literal_translation, needs_review, archived FROM vocabulary
+            WHERE chinese = ? AND pinyin = ? AND category = ?
+            ORDER BY id
+        ''', group).fetchall()
+        spanish = _join_distinct([row[1] for row in rows], " / ")
+        explanation = _join_distinct([row[2] for row in rows], "\n")
+        literal_translation = _join_distinct([row[3] for row in rows], " / ")
+        if (spanish, explanation, literal_translation) != tuple(rows[0][1:4]):
+            merged += 1
+        # Las marcas de repaso/archivado de las copias tampoco se pierden
+        cursor.execute('''
+            UPDATE vocabulary
+            SET spanish = ?, explanation = ?, literal_translation = ?, needs_review = ?, archived = ?
+            WHERE id = ?
+        ''', (spanish, explanation, literal_translation,
+              max(row[4] or 0 for row in rows), max(row[5] or 0 for row in rows), rows[0][0]))
+        cursor.executemany("DELETE FROM vocabulary WHERE id = ?", [(row[0],) for row in rows[1:]])
+    if groups:
+        logger.warning(
+            "Palabras repetidas unidas: %d grupos, %d con traducciones o explicaciones distintas combinadas",
+            len(groups), merged
+        )
+    # Clave de UPSERT para la importación; reemplaza al índice (chinese, pinyin)
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_vocabulary_unique_word
+        ON vocabulary (chinese, pinyin, category)
+    ''')
+    cursor.execute("DROP INDEX IF EXISTS idx_vocabulary_word")
+
+# Migraciones en orden: la versión del esquema (PRAGMA user_version) es la
+# cantidad de migraciones aplicadas. Solo se agregan al final, nunca se reordenan.
+MIGRATIONS = [
+    _migration_base_schema,
+    _migration_seed_vocabulary,
+    _migration_query_indexes,
+    _migration_unique_words,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Columnas del CSV de importación
+CSV_REQUIRED_COLUMNS = ['chinese', 'pinyin', 'spanish', 'category']
+CSV_OPTIONAL_COLUMNS = ['explanation', 'literal_translation']
+# Importación por lotes: filas por transacción, filas de vista previa y errores detallados como máximo
+IMPORT_CHUNK_ROWS = 5000
+IMPORT_PREVIEW_ROWS = 10
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+# Modo escritura: palabras siguientes cuyos trazos se precargan en segundo plano
+PREFETCH_WORDS = 5
+
 class VocabularyDB:
     def __init__(self, db_path: str = "vocabulary.db"):
         self.db_path = db_path
+        # Streamlit usa un hilo nuevo en cada ejecución del script: las conexiones viven en un
+        # pool (y no en el hilo) para que ellas y sus sentencias preparadas duren toda la vida del proceso
+        self._pool = queue.Queue()
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        self._local = threading.local()
+        # Caché de lecturas compartida por todas las sesiones; cada escritura
+        # incrementa el contador de generación y la vacía
+        self._generation = 0
+        self._cache = {}
+        self._cache_lock = threading.Lock()
         self.init_database()
+
+    def _open_connection(self) -> sqlite3.Connection:
+        """Crear una conexión nueva para el pool"""
+        # isolation_level=None: modo autocommit, las escrituras usan transaction()
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=SQLITE_BUSY_TIMEOUT,
+            isolation_level=None,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+            check_same_thread=False
+        )
+        # WAL permite lectores concurrentes mientras otro hilo escribe (se configura una vez por conexión)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        """Tomar una conexión libre del pool, creándola si aún no se llegó a SQLITE_POOL_SIZE"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            create = self._created < SQLITE_POOL_SIZE
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._open_connection()
+            except BaseException:
+                with self._pool_lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._pool.get(timeout=SQLITE_BUSY_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("No hay conexiones libres en el pool")
+
+    @contextmanager
+    def _connection(self):
+        """Usar una conexión del pool durante el bloque.
+
+        Dentro del mismo hilo los bloques anidados comparten la conexión, así una
+        lectura dentro de transaction() ve la transacción en curso.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Ejecutar un bloque de escrituras dentro de una única transacción.
+
+        Hace commit al salir del bloque y rollback si ocurre una excepción.
+        Las llamadas anidadas se unen a la transacción exterior.
+        """
+        with self._connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def _invalidate(self):
+        """Marcar como obsoletos los datos en caché tras una escritura"""
+        with self._cache_lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def _read_through(self, key: Tuple, loader):
+        """Devolver el valor en caché para key, o cargarlo con loader() y guardarlo"""
+        with self._cache_lock:
+            generation = self._generation
+            if key in self._cache:
+                return self._cache[key]
+        
+        value = loader()
+        
+        with self._cache_lock:
+            # No guardar si hubo una escritura mientras se consultaba
+            if generation == self._generation:
+                self._cache[key] = value
+        return value
+
+    @property
+    def generation(self) -> int:
+        """Generación actual de los datos (cambia con cada escritura)"""
+        return self._generation
+
+    def close(self):
+        """Cerrar las conexiones libres del pool"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._pool_lock:
+                self._created -= 1
     
     def init_database(self):
-        """Inicializar base de datos con datos por defecto"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Crear tabla de vocabulario
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS vocabulary (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chinese TEXT NOT NULL,
-                pinyin TEXT NOT NULL,
-                spanish TEXT NOT NULL,
-                category TEXT NOT NULL,
-                needs_review BOOLEAN DEFAULT 0,
-                archived BOOLEAN DEFAULT 0,
-                explanation TEXT,
-                literal_translation TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Verificar si la columna needs_review existe, si no, agregarla
-        cursor.execute("PRAGMA table_info(vocabulary)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'needs_review' not in columns:
-            cursor.execute('ALTER TABLE vocabulary ADD COLUMN needs_review BOOLEAN DEFAULT 0')
-        
-        if 'archived' not in columns:
-            cursor.execute('ALTER TABLE vocabulary ADD COLUMN archived BOOLEAN DEFAULT 0')
-    
-        if 'explanation' not in columns:
-            cursor.execute('ALTER TABLE vocabulary ADD COLUMN explanation TEXT')
-            
-        if 'literal_translation' not in columns:
-            cursor.execute('ALTER TABLE vocabulary ADD COLUMN literal_translation TEXT')
+        """Aplicar las migraciones pendientes del esquema"""
+        if self.get_schema_version() >= SCHEMA_VERSION:
+            return
 
-        # Crear tabla de configuración
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS config (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            )
-        ''')
-        
-        # Verificar si ya hay datos
-        cursor.execute("SELECT COUNT(*) FROM vocabulary")
-        count = cursor.fetchone()[0]
-        
-        if count == 0:
-            # Insertar datos por defecto
-            default_data = [
-                # Saludos y Cortesía
-                ('你好', 'nǐ hǎo', 'Hola', 'Saludos y Cortesía'),
-                ('再见', 'zài jiàn', 'Adiós', 'Saludos y Cortesía'),
-                ('谢谢', 'xiè xie', 'Gracias', 'Saludos y Cortesía'),
-                ('请', 'qǐng', 'Por favor', 'Saludos y Cortesía'),
-                ('对不起', 'duì bu qǐ', 'Lo siento', 'Saludos y Cortesía'),
-                ('没关系', 'méi guān xi', 'No importa', 'Saludos y Cortesía'),
-                ('欢迎', 'huān yíng', 'Bienvenido', 'Saludos y Cortesía'),
-                
-                # Números
-                ('一', 'yī', 'Uno', 'Números'),
-                ('二', 'èr', 'Dos', 'Números'),
-                ('三', 'sān', 'Tres', 'Números'),
-                ('四', 'sì', 'Cuatro', 'Números'),
-                ('五', 'wǔ', 'Cinco', 'Números'),
-                ('六', 'liù', 'Seis', 'Números'),
-                ('七', 'qī', 'Siete', 'Números'),
-                ('八', 'bā', 'Ocho', 'Números'),
-                ('九', 'jiǔ', 'Nueve', 'Números'),
-                ('十', 'shí', 'Diez', 'Números'),
-                
-                # Familia
-                ('爸爸', 'bà ba', 'Papá', 'Familia'),
-                ('妈妈', 'mā ma', 'Mamá', 'Familia'),
-                ('儿子', 'ér zi', 'Hijo', 'Familia'),
-                ('女儿', 'nǚ ér', 'Hija', 'Familia'),
-                ('哥哥', 'gē ge', 'Hermano mayor', 'Familia'),
-                ('姐姐', 'jiě jie', 'Hermana mayor', 'Familia'),
-                ('弟弟', 'dì di', 'Hermano menor', 'Familia'),
-                ('妹妹', 'mèi mei', 'Hermana menor', 'Familia'),
-                
-                # Aula
-                ('老师', 'lǎo shī', 'Profesor/a', 'Aula'),
-                ('学生', 'xué sheng', 'Estudiante', 'Aula'),
-                ('问题', 'wèn tí', 'Pregunta', 'Aula'),
-                ('答案', 'dá àn', 'Respuesta', 'Aula'),
-                ('汉语', 'hàn yǔ', 'Chino (idioma)', 'Aula'),
-                ('明白', 'míng bai', 'Entender', 'Aula'),
-                ('说', 'shuō', 'Hablar/Decir', 'Aula'),
-                ('听', 'tīng', 'Escuchar', 'Aula'),
-                
-                # Colores
-                ('红色', 'hóng sè', 'Rojo', 'Colores'),
-                ('蓝色', 'lán sè', 'Azul', 'Colores'),
-                ('绿色', 'lǜ sè', 'Verde', 'Colores'),
-                ('黄色', 'huáng sè', 'Amarillo', 'Colores'),
-                ('黑色', 'hēi sè', 'Negro', 'Colores'),
-                ('白色', 'bái sè', 'Blanco', 'Colores'),
-                ('紫色', 'zǐ sè', 'Morado', 'Colores'),
-                
-                # Tiempo
-                ('今天', 'jīn tiān', 'Hoy', 'Tiempo'),
-                ('明天', 'míng tiān', 'Mañana', 'Tiempo'),
-                ('昨天', 'zuó tiān', 'Ayer', 'Tiempo'),
-                ('现在', 'xiàn zài', 'Ahora', 'Tiempo'),
-                ('早上', 'zǎo shang', 'Mañana (AM)', 'Tiempo'),
-                ('晚上', 'wǎn shang', 'Noche', 'Tiempo'),
-                ('年', 'nián', 'Año', 'Tiempo'),
-                ('月', 'yuè', 'Mes', 'Tiempo'),
-                ('天', 'tiān', 'Día', 'Tiempo'),
-            ]
-            
-            cursor.executemany('''
-                INSERT INTO vocabulary (chinese, pinyin, spanish, category)
-                VALUES (?, ?, ?, ?)
-            ''', default_data)
-        
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            # Releer dentro del bloqueo: otro proceso pudo migrar mientras tanto
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            for number in range(version, SCHEMA_VERSION):
+                MIGRATIONS[number](cursor)
+                cursor.execute(f"PRAGMA user_version = {number + 1}")
+
+    def get_schema_version(self) -> int:
+        """Obtener la versión actual del esquema"""
+        with self._connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
 
     def toggle_word_archived(self, chinese: str, pinyin: str) -> bool:
         """Alternar estado de archivado de una palabra"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Verificar si la columna archived existe
-            cursor.execute("PRAGMA table_info(vocabulary)")
-            columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'archived' not in columns:
-                cursor.execute('ALTER TABLE vocabulary ADD COLUMN archived BOOLEAN DEFAULT 0')
-                conn.commit()
-            
-            # Obtener estado actual
-            cursor.execute('''
-                SELECT COALESCE(archived, 0) FROM vocabulary 
-                WHERE chinese = ? AND pinyin = ?
-            ''', (chinese, pinyin))
-            
-            result = cursor.fetchone()
-            if result:
-                current_state = result[0] or 0  # Asegurar que sea 0 si es None
-                new_state = 0 if current_state else 1
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Obtener estado actual
                 cursor.execute('''
-                    UPDATE vocabulary 
-                    SET archived = ?
+                    SELECT COALESCE(archived, 0) FROM vocabulary 
                     WHERE chinese = ? AND pinyin = ?
-                ''', (new_state, chinese, pinyin))
-                conn.commit()
-                conn.close()
-                return bool(new_state)
+                ''', (chinese, pinyin))
+                
+                result = cursor.fetchone()
+                if result:
+                    current_state = result[0] or 0  # Asegurar que sea 0 si es None
+                    new_state = 0 if current_state else 1
+                    cursor.execute('''
+                        UPDATE vocabulary 
+                        SET archived = ?
+                        WHERE chinese = ? AND pinyin = ?
+                    ''', (new_state, chinese, pinyin))
+                else:
+                    return False
             
-            conn.close()
-            return False
+            self._invalidate()
+            return bool(new_state)
         except Exception as e:
             st.error(f"Error al cambiar estado de archivado: {e}")
             return False
@@ -191,58 +429,44 @@ class VocabularyDB:
     def get_word_archived_status(self, chinese: str, pinyin: str) -> bool:
         """Obtener estado de archivado de una palabra"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT archived FROM vocabulary 
-                WHERE chinese = ? AND pinyin = ?
-            ''', (chinese, pinyin))
-            result = cursor.fetchone()
-            conn.close()
+            with self._connection() as conn:
+                result = conn.execute('''
+                    SELECT archived FROM vocabulary 
+                    WHERE chinese = ? AND pinyin = ?
+                ''', (chinese, pinyin)).fetchone()
             return bool(result[0]) if result else False
         except:
             return False
 
     def get_archived_count(self, category: str = None) -> int:
         """Obtener cantidad de palabras archivadas"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if category and category != "Todas las categorías":
-            cursor.execute("SELECT COUNT(*) FROM vocabulary WHERE archived = 1 AND category = ?", (category,))
-        else:
-            cursor.execute("SELECT COUNT(*) FROM vocabulary WHERE archived = 1")
-        
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
+        return self._get_stats_for(category)['archived']
 
     def toggle_word_review(self, chinese: str, pinyin: str) -> bool:
         """Alternar estado de revisión de una palabra"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Obtener estado actual
-            cursor.execute('''
-                SELECT needs_review FROM vocabulary 
-                WHERE chinese = ? AND pinyin = ?
-            ''', (chinese, pinyin))
-            
-            result = cursor.fetchone()
-            if result:
-                new_state = 0 if result[0] else 1
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Obtener estado actual
                 cursor.execute('''
-                    UPDATE vocabulary 
-                    SET needs_review = ?
+                    SELECT needs_review FROM vocabulary 
                     WHERE chinese = ? AND pinyin = ?
-                ''', (new_state, chinese, pinyin))
-                conn.commit()
-                conn.close()
-                return bool(new_state)
+                ''', (chinese, pinyin))
+                
+                result = cursor.fetchone()
+                if result:
+                    new_state = 0 if result[0] else 1
+                    cursor.execute('''
+                        UPDATE vocabulary 
+                        SET needs_review = ?
+                        WHERE chinese = ? AND pinyin = ?
+                    ''', (new_state, chinese, pinyin))
+                else:
+                    return False
             
-            conn.close()
-            return False
+            self._invalidate()
+            return bool(new_state)
         except Exception as e:
             st.error(f"Error al cambiar estado de revisión: {e}")
             return False
@@ -250,72 +474,75 @@ class VocabularyDB:
     def get_word_review_status(self, chinese: str, pinyin: str) -> bool:
         """Obtener estado de revisión de una palabra"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT needs_review FROM vocabulary 
-                WHERE chinese = ? AND pinyin = ?
-            ''', (chinese, pinyin))
-            result = cursor.fetchone()
-            conn.close()
+            with self._connection() as conn:
+                result = conn.execute('''
+                    SELECT needs_review FROM vocabulary 
+                    WHERE chinese = ? AND pinyin = ?
+                ''', (chinese, pinyin)).fetchone()
             return bool(result[0]) if result else False
         except:
             return False
 
     def get_review_words_by_category(self, category: str) -> List[Dict]:
         """Obtener palabras marcadas para revisión por categoría"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if category == "Todas las categorías":
-            cursor.execute("SELECT chinese, pinyin, spanish, category, explanation, literal_translation FROM vocabulary WHERE needs_review = 1")
-        else:
-            cursor.execute("SELECT chinese, pinyin, spanish, category, explanation, literal_translation FROM vocabulary WHERE category = ? AND needs_review = 1", (category,))
-        
-        words = []
-        for row in cursor.fetchall():
-            words.append({
-                'chinese': row[0],
-                'pinyin': row[1],
-                'spanish': row[2],
-                'category': row[3],
-                'explanation': row[4] if len(row) > 4 else '',
-                'literal_translation': row[5] if len(row) > 5 else ''
-            })
+        def load():
+            with self._connection() as conn:
+                if category == "Todas las categorías":
+                    cursor = conn.execute("SELECT chinese, pinyin, spanish, category, explanation, literal_translation FROM vocabulary WHERE needs_review = 1")
+                else:
+                    cursor = conn.execute("SELECT chinese, pinyin, spanish, category, explanation, literal_translation FROM vocabulary WHERE category = ? AND needs_review = 1", (category,))
+                
+                return [self._row_to_word(row) for row in cursor.fetchall()]
         
-        conn.close()
-        return words
+        return list(self._read_through(('review_words', category), load))
 
     def get_review_count(self, category: str = None) -> int:
         """Obtener cantidad de palabras marcadas para revisión"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if category and category != "Todas las categorías":
-            cursor.execute("SELECT COUNT(*) FROM vocabulary WHERE needs_review = 1 AND category = ?", (category,))
-        else:
-            cursor.execute("SELECT COUNT(*) FROM vocabulary WHERE needs_review = 1")
+        return self._get_stats_for(category)['review']
+
+    def get_category_stats(self) -> Dict[str, Dict[str, int]]:
+        """Obtener total, repaso, archivadas y activas por categoría en una sola consulta.
+
+        Incluye la entrada "Todas las categorías" con la suma de todas.
+        El resultado queda en caché hasta la próxima escritura.
+        """
+        def load():
+            stats = {}
+            # Se resuelve recorriendo solo el índice (category, archived, needs_review)
+            with self._connection() as conn:
+                rows = conn.execute('''
+                    SELECT category,
+                           COUNT(*),
+                           SUM(CASE WHEN needs_review = 1 THEN 1 ELSE 0 END),
+                           SUM(CASE WHEN archived = 1 THEN 1 ELSE 0 END),
+                           SUM(CASE WHEN archived = 0 THEN 1 ELSE 0 END)
+                    FROM vocabulary
+                    GROUP BY category
+                    ORDER BY category
+                ''').fetchall()
+            for category, total, review, archived, active in rows:
+                stats[category] = {'total': total, 'review': review, 'archived': archived, 'active': active}
+            
+            stats["Todas las categorías"] = {
+                key: sum(category_stats[key] for category_stats in stats.values())
+                for key in ('total', 'review', 'archived', 'active')
+            }
+            return stats
         
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
+        return self._read_through(('category_stats',), load)
+
+    def _get_stats_for(self, category: Optional[str]) -> Dict[str, int]:
+        """Estadísticas de una categoría (o de todas si category es None)"""
+        stats = self.get_category_stats()
+        return stats.get(category or "Todas las categorías", {'total': 0, 'review': 0, 'archived': 0, 'active': 0})
 
     def get_categories(self) -> List[str]:
         """Obtener todas las categorías disponibles"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT category FROM vocabulary ORDER BY category")
-        categories = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return categories
+        return [category for category in self.get_category_stats() if category != "Todas las categorías"]
     
-    def get_words_by_category(self, category: str, review_only: bool = False, archived_only: bool = False) -> List[Dict]:
-        """Obtener palabras por categoría con opciones de filtrado"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Construir consulta base
-        base_query = "SELECT chinese, pinyin, spanish, category, explanation, literal_translation FROM vocabulary WHERE"
+    @staticmethod
+    def _word_filter(category: str, review_only: bool = False, archived_only: bool = False) -> Tuple[str, List]:
+        """Construir la cláusula WHERE y sus parámetros para los filtros de palabras"""
         conditions = []
         params = []
         
@@ -332,46 +559,70 @@ class VocabularyDB:
         else:
             conditions.append("archived = 0")  # Por defecto, no mostrar archivadas
         
-        # Construir consulta final
-        if conditions:
-            query = f"{base_query} {' AND '.join(conditions)}"
-        else:
-            query = "SELECT chinese, pinyin, spanish, category, explanation, literal_translation FROM vocabulary WHERE archived = 0"
-        
-        cursor.execute(query, params)
+        return ' AND '.join(conditions), params
+
+    @staticmethod
+    def _row_to_word(row) -> Dict:
+        """Convertir una fila (chinese, pinyin, spanish, category, explanation, literal_translation) en diccionario"""
+        return {
+            'chinese': row[0],
+            'pinyin': row[1],
+            'spanish': row[2],
+            'category': row[3],
+            'explanation': row[4] if len(row) > 4 else '',
+            'literal_translation': row[5] if len(row) > 5 else ''
+        }
+
+    def get_words_by_category(self, category: str, review_only: bool = False, archived_only: bool = False) -> List[Dict]:
+        """Obtener palabras por categoría con opciones de filtrado (en caché hasta la próxima escritura)"""
+        def load():
+            where, params = self._word_filter(category, review_only, archived_only)
+            with self._connection() as conn:
+                cursor = conn.execute(
+                    f"SELECT chinese, pinyin, spanish, category, explanation, literal_translation FROM vocabulary WHERE {where}",
+                    params
+                )
+                return [self._row_to_word(row) for row in cursor.fetchall()]
         
-        words = []
-        for row in cursor.fetchall():
-            words.append({
-                'chinese': row[0],
-                'pinyin': row[1],
-                'spanish': row[2],
-                'category': row[3],
-                'explanation': row[4] if len(row) > 4 else '',
-                'literal_translation': row[5] if len(row) > 5 else ''
-            })
+        # Copia de la lista: quien llama puede modificarla sin afectar la caché
+        return list(self._read_through(('words', category, review_only, archived_only), load))
+
+    def _get_word_ids(self, category: str, review_only: bool = False, archived_only: bool = False) -> List[int]:
+        """Ids de las palabras que cumplen el filtro, en caché hasta la próxima escritura"""
+        def load():
+            # Solo lee el índice (el id va incluido en cada entrada del índice)
+            where, params = self._word_filter(category, review_only, archived_only)
+            with self._connection() as conn:
+                return [row[0] for row in conn.execute(f"SELECT id FROM vocabulary WHERE {where}", params)]
         
-        conn.close()
-        return words
+        return self._read_through(('ids', category, review_only, archived_only), load)
     
     def get_random_word(self, category: str, review_only: bool = False, archived_only: bool = False) -> Optional[Dict]:
         """Obtener una palabra aleatoria de la categoría con opciones de filtrado"""
-        words = self.get_words_by_category(category, review_only, archived_only)
-        if words:
-            return random.choice(words)
+        # Dos intentos: si la palabra elegida fue eliminada, la caché ya se invalidó
+        for _ in range(2):
+            ids = self._get_word_ids(category, review_only, archived_only)
+            if not ids:
+                return None
+            with self._connection() as conn:
+                row = conn.execute(
+                    "SELECT chinese, pinyin, spanish, category, explanation, literal_translation FROM vocabulary WHERE id = ?",
+                    (random.choice(ids),)
+                ).fetchone()
+            if row:
+                return self._row_to_word(row)
+            self._invalidate()
         return None
     
     def add_word(self, chinese: str, pinyin: str, spanish: str, category: str, explanation: str = '', literal_translation: str = '') -> bool:
         """Agregar nueva palabra"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO vocabulary (chinese, pinyin, spanish, category, explanation, literal_translation)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (chinese, pinyin, spanish, category, explanation, literal_translation))
-            conn.commit()
-            conn.close()
+            with self.transaction() as conn:
+                conn.execute('''
+                    INSERT INTO vocabulary (chinese, pinyin, spanish, category, explanation, literal_translation)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (chinese, pinyin, spanish, category, explanation, literal_translation))
+            self._invalidate()
             return True
         except Exception as e:
             st.error(f"Error al agregar palabra: {e}")
@@ -380,15 +631,13 @@ class VocabularyDB:
     def update_word(self, word_id: int, chinese: str, pinyin: str, spanish: str, category: str, explanation: str = '', literal_translation: str = '') -> bool:
         """Actualizar palabra existente"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE vocabulary 
-                SET chinese = ?, pinyin = ?, spanish = ?, category = ?, explanation = ?, literal_translation = ?
-                WHERE id = ?
-            ''', (chinese, pinyin, spanish, category, explanation, literal_translation, word_id))
-            conn.commit()
-            conn.close()
+            with self.transaction() as conn:
+                conn.execute('''
+                    UPDATE vocabulary 
+                    SET chinese = ?, pinyin = ?, spanish = ?, category = ?, explanation = ?, literal_translation = ?
+                    WHERE id = ?
+                ''', (chinese, pinyin, spanish, category, explanation, literal_translation, word_id))
+            self._invalidate()
             return True
         except Exception as e:
             st.error(f"Error al actualizar palabra: {e}")
@@ -397,11 +646,9 @@ class VocabularyDB:
     def delete_word(self, word_id: int) -> bool:
         """Eliminar palabra"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM vocabulary WHERE id = ?", (word_id,))
-            conn.commit()
-            conn.close()
+            with self.transaction() as conn:
+                conn.execute("DELETE FROM vocabulary WHERE id = ?", (word_id,))
+            self._invalidate()
             return True
         except Exception as e:
             st.error(f"Error al eliminar palabra: {e}")
@@ -409,91 +656,156 @@ class VocabularyDB:
     
     def get_all_words(self) -> pd.DataFrame:
         """Obtener todas las palabras como DataFrame"""
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query("SELECT * FROM vocabulary ORDER BY category, chinese", conn)
-        conn.close()
-        return df
+        with self._connection() as conn:
+            return pd.read_sql_query("SELECT * FROM vocabulary ORDER BY category, chinese", conn)
     
-    def import_from_csv(self, csv_data: str) -> Tuple[int, int]:
-        """Importar palabras desde CSV"""
+    @staticmethod
+    def _prepare_import_rows(df: pd.DataFrame, lines: List[int]) -> Tuple[List[Tuple], List[Dict]]:
+        """Normalizar un DataFrame de importación y separar filas válidas de errores.
+
+        lines contiene el número de línea del archivo de cada fila del DataFrame.
+        """
+        df = df.reindex(columns=CSV_REQUIRED_COLUMNS + CSV_OPTIONAL_COLUMNS, fill_value='')
+        df = df.fillna('').astype(str).apply(lambda column: column.str.strip())
+        
+        missing = df[CSV_REQUIRED_COLUMNS] == ''
+        invalid = missing.any(axis=1).to_numpy()
+        
+        errors = []
+        for position in invalid.nonzero()[0]:
+            empty_columns = [column for column in CSV_REQUIRED_COLUMNS if missing.iat[position, CSV_REQUIRED_COLUMNS.index(column)]]
+            errors.append({
+                'line': lines[position],
+                'error': f"Columnas obligatorias vacías: {', '.join(empty_columns)}"
+            })
+        
+        rows = list(df[~invalid].itertuples(index=False, name=None))
+        return rows, errors
+
+    def _upsert_words(self, conn: sqlite3.Connection, rows: List[Tuple]) -> int:
+        """Insertar o actualizar filas (chinese, pinyin, spanish, category, explanation, literal_translation).
+
+        Devuelve cuántas filas eran palabras nuevas. Debe llamarse dentro de transaction().
+        """
+        before = conn.execute("SELECT COUNT(*) FROM vocabulary").fetchone()[0]
+        conn.executemany('''
+            INSERT INTO vocabulary (chinese, pinyin, spanish, category, explanation, literal_translation)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (chinese, pinyin, category) DO UPDATE SET
+                spanish = excluded.spanish,
+                explanation = excluded.explanation,
+                literal_translation = excluded.literal_translation
+        ''', rows)
+        after = conn.execute("SELECT COUNT(*) FROM vocabulary").fetchone()[0]
+        return after - before
+
+    def import_from_csv(self, csv_data: str) -> Dict:
+        """Importar palabras desde un texto CSV (ver import_csv_stream)"""
+        return self.import_csv_stream(io.BytesIO(csv_data.encode('utf-8')))
+
+    def import_csv_stream(self, csv_file, chunk_rows: int = IMPORT_CHUNK_ROWS, progress_callback=None) -> Dict:
+        """Importar palabras desde un archivo CSV binario, leyéndolo por lotes.
+
+        Cada lote se confirma en su propia transacción, así la importación no acumula las filas
+        del archivo. Las palabras ya existentes (mismo chinese, pinyin y category) se actualizan
+        en lugar de duplicarse. Los errores indican la línea del archivo donde empieza cada fila.
+        progress_callback recibe la fracción del archivo procesada (0.0 - 1.0).
+        Devuelve {'added': int, 'updated': int, 'error_count': int,
+        'errors': [{'line': int, 'error': str}, ...]} con a lo sumo IMPORT_MAX_REPORTED_ERRORS errores.
+        """
+        report = {'added': 0, 'updated': 0, 'error_count': 0, 'errors': []}
+        
+        def add_errors(errors: List[Dict]):
+            report['error_count'] += len(errors)
+            room = IMPORT_MAX_REPORTED_ERRORS - len(report['errors'])
+            report['errors'].extend(errors[:max(room, 0)])
+        
+        def import_chunk(columns: List[str], chunk: List[List[str]], lines: List[int]):
+            rows, errors = self._prepare_import_rows(pd.DataFrame(chunk, columns=columns), lines)
+            add_errors(errors)
+            if rows:
+                with self.transaction() as conn:
+                    added = self._upsert_words(conn, rows)
+                report['added'] += added
+                report['updated'] += len(rows) - added
+                self._invalidate()
+            if progress_callback:
+                progress_callback(min(csv_file.tell() / total_size, 1.0))
+        
+        text = None
         try:
-            df = pd.read_csv(io.StringIO(csv_data), sep='|')
+            csv_file.seek(0, io.SEEK_END)
+            total_size = csv_file.tell() or 1
+            csv_file.seek(0)
             
-            # Verificar columnas requeridas
-            required_columns = ['chinese', 'pinyin', 'spanish', 'category']
-            if not all(col in df.columns for col in required_columns):
-                st.error(f"El CSV debe contener las columnas: {', '.join(required_columns)}")
-                return 0, 0
+            # csv.reader lleva la cuenta de líneas físicas (line_num), también en las filas
+            # malformadas o vacías, así cada error apunta a su línea real del archivo
+            text = io.TextIOWrapper(csv_file, encoding='utf-8-sig', newline='')
+            reader = csv.reader(text, delimiter='|')
+            header = next(reader, None)
+            columns = [column.strip().lower() for column in header or []]
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            # Verificar columnas requeridas
+            if not all(col in columns for col in CSV_REQUIRED_COLUMNS):
+                st.error(f"El CSV debe contener las columnas: {', '.join(CSV_REQUIRED_COLUMNS)}")
+                return report
             
-            added = 0
-            errors = 0
+            chunk, lines = [], []
+            last_line = reader.line_num
+            for fields in reader:
+                line, last_line = last_line + 1, reader.line_num
+                if not any(field.strip() for field in fields):
+                    continue  # Línea vacía
+                if len(fields) > len(columns):
+                    add_errors([{'line': line, 'error': f"Número de columnas incorrecto: {'|'.join(fields)}"}])
+                    continue
+                chunk.append(fields + [''] * (len(columns) - len(fields)))
+                lines.append(line)
+                if len(chunk) >= chunk_rows:
+                    import_chunk(columns, chunk, lines)
+                    chunk, lines = [], []
+            if chunk:
+                import_chunk(columns, chunk, lines)
             
-            for _, row in df.iterrows():
-                try:
-                    # Obtener valores opcionales
-                    explanation = row.get('explanation', '')
-                    literal_translation = row.get('literal_translation', '')
-                    
-                    cursor.execute('''
-                        INSERT INTO vocabulary (chinese, pinyin, spanish, category, explanation, literal_translation)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (row['chinese'], row['pinyin'], row['spanish'], row['category'], explanation, literal_translation))
-                    added += 1
-                except:
-                    errors += 1
-            
-            conn.commit()
-            conn.close()
-            return added, errors
+            # Las filas malformadas se informan al leerlas, antes que los errores de su lote
+            report['errors'].sort(key=lambda error: error['line'])
+            return report
         except Exception as e:
             st.error(f"Error al importar CSV: {e}")
-            return 0, 0
+            return report
+        finally:
+            if text is not None:
+                # Devolver el archivo a quien llama sin cerrarlo
+                text.detach()
     
     def set_config(self, key: str, value: str):
         """Guardar configuración"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO config (key, value)
-            VALUES (?, ?)
-        ''', (key, value))
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO config (key, value)
+                VALUES (?, ?)
+            ''', (key, value))
     
     def get_config(self, key: str, default: str = None) -> str:
         """Obtener configuración"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT value FROM config WHERE key = ?", (key,))
-        result = cursor.fetchone()
-        conn.close()
+        with self._connection() as conn:
+            result = conn.execute("SELECT value FROM config WHERE key = ?", (key,)).fetchone()
         return result[0] if result else default
 
     def save_last_flashcard(self, word_data: dict, phase: int = 1):
         """Guardar el estado del último flashcard"""
         try:
             # Convertir word_data a JSON string para almacenamiento
-            import json
             flashcard_json = json.dumps(word_data)
             
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self.transaction() as conn:
                 # Actualizar o insertar el último flashcard
-                cursor.execute("""
+                conn.executemany("""
                     INSERT OR REPLACE INTO config (key, value) 
                     VALUES (?, ?)
-                """, ('last_flashcard_data', flashcard_json))
-                
-                cursor.execute("""
-                    INSERT OR REPLACE INTO config (key, value) 
-                    VALUES (?, ?)
-                """, ('last_flashcard_phase', str(phase)))
-                
-                conn.commit()
-                return True
+                """, [('last_flashcard_data', flashcard_json),
+                      ('last_flashcard_phase', str(phase))])
+            return True
         except Exception as e:
             st.error(f"Error guardando último flashcard: {e}")
             return False
@@ -501,28 +813,23 @@ class VocabularyDB:
     def get_last_flashcard(self):
         """Obtener el estado del último flashcard"""
         try:
-            import json
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
+            with self._connection() as conn:
                 # Obtener datos del flashcard
-                cursor.execute("SELECT value FROM config WHERE key = ?", ('last_flashcard_data',))
-                result = cursor.fetchone()
+                result = conn.execute("SELECT value FROM config WHERE key = ?", ('last_flashcard_data',)).fetchone()
                 
-                if result:
-                    word_data = json.loads(result[0])
-                    
-                    # Obtener fase
-                    cursor.execute("SELECT value FROM config WHERE key = ?", ('last_flashcard_phase',))
-                    phase_result = cursor.fetchone()
-                    phase = int(phase_result[0]) if phase_result else 1
-                    
-                    return {
-                        'word_data': word_data,
-                        'phase': phase
-                    }
+                # Obtener fase
+                phase_result = conn.execute("SELECT value FROM config WHERE key = ?", ('last_flashcard_phase',)).fetchone()
+            
+            if result:
+                word_data = json.loads(result[0])
+                phase = int(phase_result[0]) if phase_result else 1
                 
-                return None
+                return {
+                    'word_data': word_data,
+                    'phase': phase
+                }
+            
+            return None
         except Exception as e:
             st.error(f"Error obteniendo último flashcard: {e}")
             return None
@@ -530,16 +837,19 @@ class VocabularyDB:
     def clear_last_flashcard(self):
         """Limpiar el estado del último flashcard"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM config WHERE key IN (?, ?)", 
-                            ('last_flashcard_data', 'last_flashcard_phase'))
-                conn.commit()
-                return True
+            with self.transaction() as conn:
+                conn.execute("DELETE FROM config WHERE key IN (?, ?)", 
+                             ('last_flashcard_data', 'last_flashcard_phase'))
+            return True
         except Exception as e:
             st.error(f"Error limpiando último flashcard: {e}")
             return False
 
+@st.cache_resource
+def get_database(db_path: str = "vocabulary.db") -> VocabularyDB:
+    """Instancia de VocabularyDB compartida por todo el proceso (las migraciones corren una sola vez)"""
+    return VocabularyDB(db_path)
+
 def hash_password(password: str) -> str:
     """Generar hash SHA-256 de la contraseña"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -622,12 +932,57 @@ def create_audio_component(text: str, auto_play: bool = False, times: int = 1, p
     </script>
     """
 
+# Cuenta regresiva del avance automático, ejecutada en el navegador (components/countdown)
+_countdown_component = components.declare_component(
+    "countdown_timer",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "countdown")
+)
+
+
+def countdown_timer(remaining: float, label: str, token, key: str) -> bool:
+    """Mostrar una cuenta regresiva que corre en el navegador, sin volver a ejecutar el script.
+
+    El componente envía un único evento al terminar; devuelve True en la ejecución provocada
+    por ese evento. token identifica la cuenta regresiva (por ejemplo phase_start_time) para
+    no confundir el aviso de una anterior con el de la actual.
+    """
+    token = str(token)
+    return _countdown_component(remaining=remaining, label=label, token=token, key=key, default=None) == token
+
+
+# Hoja de estilos de la app, servida por Streamlit desde static/
+STYLESHEET_URL = "app/static/flashcards.css"
+
+
+def inject_stylesheet():
+    """Añadir la hoja de estilos estática al <head> de la página, una sola vez por sesión.
+
+    El <link> queda en el documento aunque el iframe que lo agrega desaparezca en las
+    siguientes ejecuciones, así los estilos no se reenvían en cada rerun.
+    """
+    if st.session_state.get('stylesheet_injected'):
+        return
+    components.html(f"""
+    <script>
+        const doc = window.parent.document;
+        if (!doc.getElementById("flashcards-stylesheet")) {{
+            const link = doc.createElement("link");
+            link.id = "flashcards-stylesheet";
+            link.rel = "stylesheet";
+            link.href = new URL("{STYLESHEET_URL}", window.parent.location.href).href;
+            doc.head.appendChild(link);
+        }}
+    </script>
+    """, height=0)
+    st.session_state.stylesheet_injected = True
+
+
 def admin_panel(db: VocabularyDB):
     """Panel de administración de vocabulario"""
     st.markdown("## 🛠️ Panel de Administración")
     
     # Pestañas para diferentes funciones
-    tab1, tab2, tab3, tab4 = st.tabs(["📝 Agregar Palabra", "📊 Ver/Editar", "📤 Importar CSV", "📋 Exportar"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📝 Agregar Palabra", "📊 Ver/Editar", "📤 Importar CSV", "📋 Exportar", "🔤 Fuentes"])
     
     with tab1:
         st.markdown("### Agregar Nueva Palabra")
@@ -775,18 +1130,28 @@ def admin_panel(db: VocabularyDB):
         uploaded_file = st.file_uploader("Cargar archivo CSV", type=['csv'])
         
         if uploaded_file is not None:
-            csv_data = uploaded_file.getvalue().decode('utf-8')
+            # Vista previa: solo se leen las primeras filas del archivo
             st.markdown("**Vista previa:**")
-            preview_df = pd.read_csv(io.StringIO(csv_data), sep='|')
-            st.dataframe(preview_df.head())
+            uploaded_file.seek(0)
+            preview_df = pd.read_csv(uploaded_file, sep='|', nrows=IMPORT_PREVIEW_ROWS, dtype=str,
+                                     keep_default_na=False, encoding='utf-8', on_bad_lines='skip')
+            st.dataframe(preview_df)
             
             if st.button("📥 Importar Datos"):
-                added, errors = db.import_from_csv(csv_data)
-                if added > 0:
-                    st.success(f"✅ {added} palabras importadas exitosamente")
-                if errors > 0:
-                    st.warning(f"⚠️ {errors} errores durante la importación")
-                if added > 0:
+                progress_bar = st.progress(0.0, text="Importando...")
+                report = db.import_csv_stream(
+                    uploaded_file,
+                    progress_callback=lambda fraction: progress_bar.progress(fraction, text=f"Importando... {fraction:.0%}")
+                )
+                progress_bar.empty()
+                if report['added'] > 0:
+                    st.success(f"✅ {report['added']} palabras importadas exitosamente")
+                if report['updated'] > 0:
+                    st.info(f"🔁 {report['updated']} palabras existentes actualizadas")
+                if report['error_count'] > 0:
+                    st.warning(f"⚠️ {report['error_count']} errores durante la importación")
+                    st.dataframe(pd.DataFrame(report['errors']).rename(columns={'line': 'Línea', 'error': 'Error'}))
+                elif report['added'] > 0:
                     st.rerun()
     
     with tab4:
@@ -802,290 +1167,56 @@ def admin_panel(db: VocabularyDB):
         
         st.metric("Total de palabras a exportar", len(df))
         
-        csv = df.to_csv(index=False, sep='|')
+        csv_data = df.to_csv(index=False, sep='|')
         
         st.download_button(
             label="📥 Descargar CSV",
-            data=csv,
+            data=csv_data,
             file_name=f"vocabulario_{export_category.lower().replace(' ', '_')}.csv",
             mime="text/csv"
         )
+    
+    with tab5:
+        st.markdown("### Subconjuntos de Fuentes")
+        
+        # Las palabras nuevas se muestran con la fuente de respaldo hasta regenerar los subconjuntos
+        job = get_font_subset_job()
+        missing = missing_characters(db.db_path)
+        st.metric("Caracteres fuera de los subconjuntos", len(missing))
+        if missing:
+            st.caption("".join(sorted(missing)[:200]))
+        
+        if not job.available():
+            st.info("No hay fuentes completas o fontTools en este entorno: los subconjuntos se generan al construir la imagen")
+        elif job.running():
+            st.info("⏳ Regenerando los subconjuntos en segundo plano...")
+            if st.button("🔄 Actualizar estado", key="font_job_refresh"):
+                st.rerun()
+        else:
+            status = job.status()
+            if status == 0:
+                st.success("✅ Subconjuntos regenerados")
+            elif status is not None:
+                st.error(f"❌ La regeneración terminó con código {status}")
+                if os.path.exists(SUBSET_LOG_PATH):
+                    with open(SUBSET_LOG_PATH, "r", encoding="utf-8", errors="replace") as log:
+                        st.code(log.read()[-2000:])
+            
+            if st.button("🔤 Regenerar subconjuntos", key="font_job_start", disabled=not missing):
+                job.start()
+                st.rerun()
 
 def main():
+    run_started = time.perf_counter()
+    
     # Verificar acceso
     check_access()
     
-    # Inicializar base de datos
-    db = VocabularyDB()
+    # Base de datos compartida por el proceso
+    db = get_database()
     
-    # CSS personalizado
-    st.markdown("""
-    <link href="https://fonts.googleapis.com/css2?family=Noto+Serif+SC&display=swap" rel="stylesheet">
-    <link href="https://fonts.googleapis.com/css2?family=Montserrat:wght@500&display=swap" rel="stylesheet">
-    <link href="https://fonts.googleapis.com/css2?family=Noto+Sans+SC:wght@100..900&display=swap" rel="stylesheet">
-    <link href="https://fonts.googleapis.com/css2?family=Noto+Serif+SC:wght@200..900&display=swap" rel="stylesheet">
-    <link href="https://fonts.googleapis.com/css2?family=Source+Han+Sans+SC&display=swap" rel="stylesheet">
-    <style>
-        @font-face {
-            font-family: KaiTi;
-            src: url('https://munihuayucachi.servicios.gob.pe/eeefb172-d17a-4a1e-8276-5ea006fc7770/fonts/KaiTi.woff2') format('woff2');
-            font-weight: normal;
-            font-style: normal;
-            font-display: swap;
-        }
-        @font-face {
-            font-family: Libertine;
-            src: url('https://munihuayucachi.servicios.gob.pe/eeefb172-d17a-4a1e-8276-5ea006fc7770/fonts/Libertine.woff2') format('woff2');
-            font-weight: normal;
-            font-style: normal;
-            font-display: swap;
-        }
-        .stroke-chinese-word {
-            font-family: var(--chinese-font), 'Noto Serif SC', serif !important;
-            font-size: 2.8em !important;
-        }
-        .main-title {
-            font-family: var(--chinese-font), 'Noto Serif SC', serif !important;
-            font-size: 3em;
-            text-align: center;
-            color: #c0392b;
-            margin-bottom: 30px;
-        }
-        .chinese-word {
-            font-family: var(--chinese-font), 'Noto Serif SC', serif !important;
-            font-size: 7em;
-            text-align: center;
-            color: #000000;
-            background: #FFFFFF;
-            padding: 50px;
-            border-radius: 20px;
-            margin: 30px 0;
-            border: 4px solid #3498db;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-            .review-indicator {
-                position: absolute; top: 10px; right: 10px; 
-                background: #e74c3c; color: white; padding: 5px 10px; 
-                border-radius: 15px; font-size: 0.2em;
-            }
-            .pinyin {
-                font-size: 0.3em;
-                font-family: var(--chinese-font), sans-serif;
-                font-weight: 500;
-                p {
-                    color: #34495e;
-                    margin: 0;
-                    align-items: center;
-                    text-align: center;
-                    font-size: 1.0em;
-                    font-family: var(--chinese-font), sans-serif;
-                }
-            }
-
-            .translation {
-                font-size: 0.2em;
-                font-family: 'Montserrat', sans-serif;
-                p {
-                    color: #34495e;
-                    margin: 0;
-                    align-items: center;
-                    text-align: center;
-                    font-size: 1.0em;
-                    font-family: Libertine, sans-serif;
-                }
-            }
-        }
-        .literal-translation {
-            background: #e8f4f8;
-            padding: 15px;
-            border-radius: 10px;
-            margin: 10px 0;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            font-family: 'Montserrat', sans-serif;
-            color: #34495e;
-            p {
-                color: #34495e;
-                margin: 0;
-                align-items: center;
-                text-align: center;
-                font-size: 1.8em;
-                font-family: Libertine, sans-serif;
-            }
-        }
-        .explanation {
-            background: #e8f4f8;
-            padding: 15px;
-            border-radius: 10px;
-            margin: 10px 0;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            font-family: 'Montserrat', sans-serif;
-            color: #34495e;
-            p {
-                color: #34495e;
-                margin: 0;
-                align-items: center;
-                text-align: center;
-                font-size: 1.8em;
-                font-family: Libertine, sans-serif;
-            }
-        }
-        .review-indicator {
-            border-right: 4px solid #e74c3c;
-            padding-right: 10px;
-        }
-        .pinyin-translation {
-            font-size: 2em;
-            text-align: center;
-            color: #8e44ad;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 30px;
-            border-radius: 15px;
-            margin: 20px 0;
-            font-weight: bold;
-        }
-        .phase-indicator {
-            font-size: 1.0em;
-            text-align: center;
-            padding: 15px;
-            border-radius: 10px;
-            margin: 20px 0;
-            font-weight: bold;
-        }
-        .phase-1 { background: #e8f5e8; color: #27ae60; }
-        .phase-2 { background: #fff3cd; color: #f39c12; }
-        .phase-3 { background: #f8d7da; color: #c0392b; }
-        .countdown-timer {
-            text-align: center;
-            margin: 20px 0;
-            padding: 15px;
-            background: #f39c12;
-            color: white;
-            border-radius: 10px;
-            font-size: 1.0em;
-            font-weight: bold;
-        }
-        .audio-playing {
-            text-align: center;
-            margin: 20px 0;
-            padding: 20px;
-            background: #2ecc71;
-            color: white;
-            border-radius: 10px;
-            font-size: 1.3em;
-            animation: pulse 2s infinite;
-        }
-        .listening-mode {
-            text-align: center;
-            margin: 20px 0;
-            padding: 30px;
-            background: #3498db;
-            color: white;
-            border-radius: 10px;
-            font-size: 1.5em;
-        }
-        .text-analysis-container {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 20px;
-            border-radius: 15px;
-            margin: 20px 0;
-            color: white;
-        }
-        .input-text-display {
-            background: rgba(255,255,255,0.1);
-            padding: 15px;
-            border-radius: 10px;
-            margin: 15px 0;
-            text-align: center;
-            border: 2px solid rgba(255,255,255,0.2);
-        }
-        .chinese-input-text {
-            font-size: 2.8em;
-            font-family: var(--chinese-font), 'Noto Serif SC', serif !important;
-            margin-bottom: 10px;
-        }
-        .pinyin-display {
-            font-size: 1.3em;
-            color: #ffd700;
-            margin-bottom: 10px;
-        }
-        .character-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 20px;
-            margin: 20px 0;
-        }
-        .character-card {
-            background: white;
-            border-radius: 10px;
-            padding: 15px;
-            text-align: center;
-            box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-        }
-        @keyframes pulse {
-            0% { opacity: 1; }
-            50% { opacity: 0.7; }
-            100% { opacity: 1; }
-        }
-        @media (max-width: 768px) and (orientation: portrait) {
-            .chinese-word {
-                font-size: 4em;
-                padding: 10px;
-                background: #FFFFFF;
-                .pinyin {
-                    font-size: 0.3em;
-                    font-family: Libertine, sans-serif;
-                    font-weight: 500;
-                }
-
-                .translation {
-                    font-size: 0.3em;
-                    font-family: 'Montserrat', sans-serif;
-                }
-            }
-            .pinyin-translation {
-                font-size: 1.0em;
-                padding: 20px;
-            }
-            .chinese-input-text {
-                font-size: 6em;
-                font-family: var(--chinese-font), 'Noto Serif SC', serif !important;
-                margin-bottom: 10px;
-            }
-        }
-        @media (max-height: 500px) and (orientation: landscape) and (max-width: 1024px) {
-            .chinese-word {
-                font-size: 3.8em; /* slightly larger */
-                padding: 12px;
-                background: #FFFFFF;
-            }
-
-            .chinese-word .pinyin {
-                font-size: 0.35em;
-                font-family: Libertine, sans-serif;
-                font-weight: 500;
-            }
-
-            .chinese-word .translation {
-                font-size: 0.25em;
-                font-family: 'Montserrat', sans-serif;
-            }
-
-            .pinyin-translation {
-                font-size: 1.2em;
-                padding: 25px;
-            }
-            .chinese-input-text {
-                font-size: 5.8em;
-                font-family: var(--chinese-font), 'Noto Serif SC', serif !important;
-                margin-bottom: 10px;
-            }
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    # Hoja de estilos estática (static/flashcards.css), una vez por sesión
+    inject_stylesheet()
     
     # Sidebar para navegación
     with st.sidebar:
@@ -1105,8 +1236,11 @@ def main():
         st.markdown("---")
         st.markdown("### ⚙️ Configuraciones")
         
+        # Estadísticas de todas las categorías (una sola consulta, en caché hasta la próxima escritura)
+        category_stats = db.get_category_stats()
+        
         # Selección de categoría con persistencia
-        categories = ["Todas las categorías"] + db.get_categories()
+        categories = ["Todas las categorías"] + [category for category in category_stats if category != "Todas las categorías"]
         saved_category = db.get_config('selected_category', 'Todas las categorías')
         
         try:
@@ -1199,8 +1333,9 @@ def main():
             st.markdown("---")
             st.markdown("### 📊 Estadísticas")
             st.metric("Palabras estudiadas", st.session_state.get('words_studied', 0))
-            st.metric("Palabras para repasar", db.get_review_count(selected_category))
-            st.metric("Palabras archivadas", db.get_archived_count(selected_category))
+            selected_stats = category_stats.get(selected_category, {'review': 0, 'archived': 0})
+            st.metric("Palabras para repasar", selected_stats['review'])
+            st.metric("Palabras archivadas", selected_stats['archived'])
 
         else:
             # Para modo análisis de texto, mostrar información diferente
@@ -1233,8 +1368,6 @@ def main():
         st.session_state.words_studied = 0
     if 'current_category' not in st.session_state:
         st.session_state.current_category = selected_category
-    if 'last_update' not in st.session_state:
-        st.session_state.last_update = time.time()
     if 'learning_mode' not in st.session_state:
         st.session_state.learning_mode = learning_mode
     if 'word_history' not in st.session_state:
@@ -1274,11 +1407,11 @@ def main():
 
     # Mostrar estadísticas según el filtro seleccionado
     if st.session_state.review_filter_state:
-        review_count = db.get_review_count(selected_category)
+        review_count = category_stats.get(selected_category, {}).get('review', 0)
         if review_count > 0:
             st.info(f"📝 {review_count} palabra(s) marcada(s) para repasar en esta categoría")
     elif st.session_state.archived_filter:
-        archived_count = db.get_archived_count(selected_category)
+        archived_count = category_stats.get(selected_category, {}).get('archived', 0)
         if archived_count > 0:
             st.info(f"📦 {archived_count} palabra(s) archivada(s) en esta categoría")
 
@@ -1344,6 +1477,29 @@ def main():
                 📚 Modo Aprendizaje: Estudia la palabra completa
             </div>
             """, unsafe_allow_html=True)
+    # Tarjeta, controles y cuenta regresiva: se vuelven a ejecutar solos (st.fragment)
+    flashcard_area(db, review_filter, archived_filter)
+    logger.debug("Ejecución completa del script: %.1f ms", (time.perf_counter() - run_started) * 1000)
+
+
+def rerun_card():
+    """Volver a ejecutar solo el fragmento de la tarjeta; durante una ejecución completa, toda la app"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        # st.rerun(scope="fragment") no se permite cuando el fragmento corre dentro de una ejecución completa
+        st.rerun()
+
+
+@st.fragment
+def flashcard_area(db: VocabularyDB, review_filter: bool, archived_filter: bool):
+    """Controles, tarjeta y cuenta regresiva del modo flashcard.
+
+    Es un fragmento: los botones y la cuenta regresiva vuelven a ejecutar solo esta función,
+    sin el CSS, la barra lateral ni las consultas de estadísticas de main().
+    """
+    fragment_started = time.perf_counter()
+    
     # Controles principales
     col1, col2, col3, col4, col5 = st.columns(5)
     
@@ -1375,14 +1531,12 @@ def main():
                     st.session_state.session_started = True
                     
                     st.success(f"✅ Flashcard anterior restaurado: {word_data['chinese']}")
-                    st.rerun()
+                    rerun_card()
             
             # Lógica para obtener nueva palabra según el modo seleccionado
             if st.session_state.random_order:
                 # Modo aleatorio
-                word_data = db.get_random_word(st.session_state.current_category, 
-                                         review_only=st.session_state.review_filter_state, 
-                                         archived_only=st.session_state.archived_filter)
+                word_data = next_random_word(db)
 
             else:
                 # Modo secuencial
@@ -1425,7 +1579,7 @@ def main():
                 
                 # Guardar el nuevo flashcard
                 db.save_last_flashcard(word_data, st.session_state.phase)
-                st.rerun()
+                rerun_card()
     
     with col2:
         play_text = "⏸️ Pausar" if st.session_state.is_playing else "▶️ Iniciar"
@@ -1434,7 +1588,7 @@ def main():
                 st.session_state.is_playing = not st.session_state.is_playing
                 if st.session_state.is_playing:
                     st.session_state.phase_start_time = time.time()
-                st.rerun()
+                rerun_card()
     
     with col3:
         if st.button("⏮️ Anterior", key="prev_phase", use_container_width=True):
@@ -1464,7 +1618,7 @@ def main():
                 st.session_state.is_playing = True
                 
                 db.save_last_flashcard(word_data, st.session_state.phase)
-                st.rerun()
+                rerun_card()
     
     with col4:
         if st.button("⏭️ Siguiente", key="next_phase", use_container_width=True):
@@ -1480,9 +1634,7 @@ def main():
                     
                     # Usar la lógica de selección de palabras según el modo
                     if st.session_state.random_order:
-                        word_data = db.get_random_word(st.session_state.current_category, 
-                                         review_only=st.session_state.review_filter_state, 
-                                         archived_only=st.session_state.archived_filter)
+                        word_data = next_random_word(db)
                         
 
                     else:
@@ -1543,9 +1695,7 @@ def main():
                         
                         # Usar la lógica de selección de palabras según el modo
                         if st.session_state.random_order:
-                            word_data = db.get_random_word(st.session_state.current_category, 
-                                         review_only=st.session_state.review_filter_state, 
-                                         archived_only=st.session_state.archived_filter)
+                            word_data = next_random_word(db)
 
                         else:
                             # Modo secuencial
@@ -1579,7 +1729,7 @@ def main():
                             # Guardar el nuevo flashcard
                             db.save_last_flashcard(word_data, 1)
                 
-                st.rerun()
+                rerun_card()
 
     with col5:
         if st.button("🔄 Reiniciar", key="reset", use_container_width=True):
@@ -1589,7 +1739,7 @@ def main():
             st.session_state.phase_start_time = None
             st.session_state.words_studied = 0
             st.session_state.dictation_revealed = False
-            st.rerun()
+            rerun_card()
 
     # Área principal de flashcard
     if st.session_state.current_word is None:
@@ -1655,72 +1805,29 @@ def main():
                         # Crear columnas para cada carácter
                         cols = st.columns(len(chinese_chars))
                         
+                        # Todos los caracteres de la palabra en un solo lote paralelo
+                        with st.spinner('Cargando trazos...'):
+                            characters_data = fetch_characters(chinese_chars)
+                        
                         for i, character in enumerate(chinese_chars):
                             with cols[i]:
-                                with st.spinner(f'Cargando trazos para {character}...'):
-                                    def fetch_character_data(character):
-                                        try:
-                                            encoded_char = quote(character)
-                                            url = f"http://www.strokeorder.info/mandarin.php?q={encoded_char}"
-                                            headers = {
-                                                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                                            }
-                                            response = requests.get(url, headers=headers, timeout=10)
-                                            response.raise_for_status()
-                                            html = response.text
-                                            
-                                            # Extraer pinyin
-                                            pinyin_match = re.search(r'Pinyin & Definition:.*?<[^>]*>([^<]+)', html, re.DOTALL)
-                                            pinyin = pinyin_match.group(1).strip() if pinyin_match else "N/A"
-                                            
-                                            # Extraer definición en inglés
-                                            definition_match = re.search(r'Pinyin & Definition:.*?<[^>]*>[^<]+.*?<[^>]*>([^<]+)', html, re.DOTALL)
-                                            definition = definition_match.group(1).strip() if definition_match else "N/A"
-        
-                                            gif_match = re.search(r'src="([^"]*\.gif[^"]*)"', html)
-                                            gif_url = None
-                                            
-                                            if gif_match:
-                                                gif_url = gif_match.group(1)
-                                                if gif_url.startswith('/'):
-                                                    gif_url = 'http://www.strokeorder.info' + gif_url
-                                                elif not gif_url.startswith('http'):
-                                                    gif_url = 'http://www.strokeorder.info/' + gif_url
-                                            
-                                            # Extraer número de trazos
-                                            strokes_match = re.search(r'Strokes:.*?(\d+)', html, re.DOTALL)
-                                            strokes = strokes_match.group(1) if strokes_match else "N/A"
-                                            
-                                            # Extraer radical
-                                            radical_match = re.search(r'Radical:.*?<[^>]*>([^<]+)', html, re.DOTALL)
-                                            radical = radical_match.group(1).strip() if radical_match else "N/A"
-                                            return {'gif_url': gif_url, 'pinyin': pinyin, 'definition': definition, 'strokes': strokes, 'radical': radical, 'success': True,}
-                                        except Exception as e:
-                                            return {'success': False, 'error': str(e)}
-                                    
-                                    def download_gif(gif_url):
-                                        try:
-                                            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-                                            response = requests.get(gif_url, headers=headers, timeout=10)
-                                            response.raise_for_status()
-                                            return base64.b64encode(response.content).decode()
-                                        except:
-                                            return None
-                                    
-                                    character_data = fetch_character_data(character)
-                                    
-                                    if character_data['success'] and character_data['gif_url']:
-                                        st.markdown(f"<h3 class='stroke-chinese-word' style='text-align: center; color: #1f77b4;'>{character} {character_data['pinyin']} {character_data['definition']}</h3>", unsafe_allow_html=True)
-                                        gif_base64 = download_gif(character_data['gif_url'])
-                                        if gif_base64:
-                                            st.markdown(
-                                                f'<div style="text-align: center;"><img src="data:image/gif;base64,{gif_base64}" style="max-width: 100%; border: 2px solid #e0e0e0; border-radius: 10px;"></div>',
-                                                unsafe_allow_html=True
-                                            )
-                                        else:
-                                            st.warning(f"⚠️ No se pudo cargar la animación para {character}")
+                                character_data = characters_data[character]
+                                
+                                if character_data['success'] and (character_data['gif_url'] or character_data['image_url']):
+                                    st.markdown(f"<h3 class='stroke-chinese-word' style='text-align: center; color: #1f77b4;'>{character} {character_data['pinyin']} {character_data['definition']}</h3>", unsafe_allow_html=True)
+                                    image_url = character_data['image_url']
+                                    if image_url:
+                                        st.markdown(
+                                            f'<div style="text-align: center;"><img src="{image_url}" style="max-width: 100%; border: 2px solid #e0e0e0; border-radius: 10px;"></div>',
+                                            unsafe_allow_html=True
+                                        )
                                     else:
-                                        st.warning(f"⚠️ Orden de trazos no disponible para {character}")
+                                        st.warning(f"⚠️ No se pudo cargar la animación para {character}")
+                                else:
+                                    st.warning(f"⚠️ Orden de trazos no disponible para {character}")
+                
+                # Mientras se estudia esta tarjeta, precargar los trazos de las siguientes
+                prefetch_upcoming_words(db)
             else:
                 # Modo aprendizaje normal sin escritura
                 st.markdown(f"""
@@ -1775,20 +1882,12 @@ def main():
                         countdown_text = "Nueva palabra"
                     else:
                         countdown_text = 'Siguiente fase' if st.session_state.phase < 3 else 'Nueva palabra'
-                        
-                    st.markdown(f"""
-                    <div class="countdown-timer">
-                        ⏳ {countdown_text} en: {remaining_time:.1f}s
-                    </div>
-                    """, unsafe_allow_html=True)
                     
-                    # Refresh cada 0.1 segundos
-                    if current_time - st.session_state.last_update >= 0.1:
-                        st.session_state.last_update = current_time
-                        time.sleep(0.1)
-                        st.rerun()
-                        
+                    expired = countdown_timer(remaining_time, countdown_text, st.session_state.phase_start_time, key="countdown_main")
                 else:
+                    expired = True
+                
+                if expired:
                     # Tiempo terminado - avanzar según el modo
                     if st.session_state.learning_mode or st.session_state.writing_mode:
                         # En modo aprendizaje/escritura, siempre ir a nueva palabra
@@ -1796,9 +1895,7 @@ def main():
                         
                         # Usar la lógica de selección de palabras según el modo
                         if st.session_state.random_order:
-                            word_data = db.get_random_word(st.session_state.current_category, 
-                                         review_only=st.session_state.review_filter_state, 
-                                         archived_only=st.session_state.archived_filter)
+                            word_data = next_random_word(db)
 
                         else:
                             # Modo secuencial
@@ -1845,9 +1942,7 @@ def main():
                             
                             # Usar la lógica de selección de palabras según el modo
                             if st.session_state.random_order:
-                                word_data = db.get_random_word(st.session_state.current_category, 
-                                         review_only=st.session_state.review_filter_state, 
-                                         archived_only=st.session_state.archived_filter)
+                                word_data = next_random_word(db)
 
                             else:
                                 # Modo secuencial (código existente)
@@ -1879,7 +1974,7 @@ def main():
                                 # Guardar el nuevo flashcard
                                 db.save_last_flashcard(word_data, 1)
                     
-                    st.rerun()
+                    rerun_card()
         
         elif st.session_state.listening_mode:
             # LISTENING MODE: Special flow for listening practice
@@ -1906,20 +2001,14 @@ def main():
                     remaining_time = st.session_state.wait_time * 1.5 - elapsed_time  # Give more time for listening
                     
                     if remaining_time > 0:
-                        st.markdown(f"""
-                        <div class="countdown-timer">
-                            ⏳ Mostrando palabra en: {remaining_time:.1f}s
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        if current_time - st.session_state.last_update >= 0.1:
-                            st.session_state.last_update = current_time
-                            time.sleep(0.1)
-                            st.rerun()
+                        expired = countdown_timer(remaining_time, "Mostrando palabra", st.session_state.phase_start_time, key="countdown_listening_1")
                     else:
+                        expired = True
+                    
+                    if expired:
                         st.session_state.phase = 2
                         st.session_state.phase_start_time = time.time()
-                        st.rerun()
+                        rerun_card()
                         
             elif st.session_state.phase == 2:
                 # Phase 2: Show the full flashcard
@@ -1953,22 +2042,14 @@ def main():
                     remaining_time = st.session_state.wait_time - elapsed_time
                     
                     if remaining_time > 0:
-                        st.markdown(f"""
-                        <div class="countdown-timer">
-                            ⏳ Nueva palabra en: {remaining_time:.1f}s
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        if current_time - st.session_state.last_update >= 0.1:
-                            st.session_state.last_update = current_time
-                            time.sleep(0.1)
-                            st.rerun()
+                        expired = countdown_timer(remaining_time, "Nueva palabra", st.session_state.phase_start_time, key="countdown_listening_2")
                     else:
+                        expired = True
+                    
+                    if expired:
                         # Move to next word
                         st.session_state.words_studied += 1
-                        word_data = db.get_random_word(st.session_state.current_category, 
-                                         review_only=st.session_state.review_filter_state, 
-                                         archived_only=st.session_state.archived_filter)
+                        word_data = next_random_word(db)
 
                         if word_data:
                             st.session_state.word_history.append(word_data)
@@ -1977,7 +2058,7 @@ def main():
                             st.session_state.current_data = word_data
                             st.session_state.phase = 1  # Back to listening phase
                             st.session_state.phase_start_time = time.time()
-                            st.rerun()
+                            rerun_card()
         
         # NUEVO: UI específica del Modo Dictado
         elif st.session_state.dictation_mode:
@@ -2002,7 +2083,7 @@ def main():
                 toggle_label = "👁️ Mostrar texto" if not st.session_state.dictation_revealed else "🙈 Ocultar texto"
                 if st.button(toggle_label, key="dictation_toggle"):
                     st.session_state.dictation_revealed = not st.session_state.dictation_revealed
-                    st.rerun()
+                    rerun_card()
 
             # 3) Mostrar el texto solo si fue revelado
             if st.session_state.dictation_revealed:
@@ -2060,11 +2141,7 @@ def main():
                     
                     # Reutiliza tu lógica de selección (aleatorio/secuencial)
                     if st.session_state.random_order:
-                        word_data = db.get_random_word(
-                            st.session_state.current_category,
-                            review_only=st.session_state.review_filter_state,
-                            archived_only=st.session_state.archived_filter
-                        )
+                        word_data = next_random_word(db)
                     else:
                         # Recargar la lista actualizada sin la palabra archivada
                         st.session_state.current_category_words = db.get_words_by_category(
@@ -2102,7 +2179,7 @@ def main():
                         st.success("🎉 ¡Has completado todas las palabras disponibles en esta categoría!")
                         st.session_state.current_word = None
                         st.session_state.current_data = None
-                    st.rerun()
+                    rerun_card()
 
             with colC:
                 if st.button("❌ Incorrecto", key="dictation_incorrect", use_container_width=True):
@@ -2131,11 +2208,7 @@ def main():
                     # Avanzar a la siguiente tarjeta
                     st.session_state.dictation_revealed = False
                     if st.session_state.random_order:
-                        word_data = db.get_random_word(
-                            st.session_state.current_category,
-                            review_only=st.session_state.review_filter_state,
-                            archived_only=st.session_state.archived_filter
-                        )
+                        word_data = next_random_word(db)
                     else:
                         if not st.session_state.current_category_words:
                             st.session_state.current_category_words = db.get_words_by_category(
@@ -2158,7 +2231,7 @@ def main():
                         st.session_state.current_data = word_data
                         st.session_state.phase = 1
                         db.save_last_flashcard(word_data, 1)
-                    st.rerun()
+                    rerun_card()
 
         else:
             # STANDARD FLASHCARD MODE - COPIA EXACTA DEL DISEÑO DE MODO APRENDIZAJE
@@ -2247,19 +2320,12 @@ def main():
                 
                 if remaining_time > 0:
                     # Mostrar countdown
-                    st.markdown(f"""
-                    <div class="countdown-timer">
-                        ⏳ {'Siguiente fase' if st.session_state.phase < 3 else 'Nueva palabra'} en: {remaining_time:.1f}s
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Refresh cada 0.1 segundos
-                    if current_time - st.session_state.last_update >= 0.1:
-                        st.session_state.last_update = current_time
-                        time.sleep(0.1)
-                        st.rerun()
-                        
+                    countdown_text = 'Siguiente fase' if st.session_state.phase < 3 else 'Nueva palabra'
+                    expired = countdown_timer(remaining_time, countdown_text, st.session_state.phase_start_time, key="countdown_flashcard")
                 else:
+                    expired = True
+                
+                if expired:
                     # Tiempo terminado - avanzar
                     if st.session_state.phase < 3:
                         st.session_state.phase += 1
@@ -2286,7 +2352,7 @@ def main():
                             # Guardar el nuevo flashcard
                             db.save_last_flashcard(word_data, 1)
                     
-                    st.rerun()
+                    rerun_card()
     
         # Mover el checkbox de orden aleatorio aquí si hay espacio, o crear nueva fila
         if st.session_state.current_word and st.session_state.current_data:
@@ -2300,7 +2366,7 @@ def main():
                     st.success("📤 Palabra desarchivada")
                     st.session_state.current_category_words = []
                     time.sleep(0.5)
-                    st.rerun()
+                    rerun_card()
             else:
                 # En otros modos, mostrar botones de repaso y archivar
                 col6a, col6b = st.columns(2)
@@ -2325,7 +2391,7 @@ def main():
                             st.success("❌ Palabra quitada de repaso")
                         
                         time.sleep(0.5)
-                        st.rerun()
+                        rerun_card()
                 
                 with col6b:
                     # Botón de archivar
@@ -2336,8 +2402,10 @@ def main():
                         )
                         st.success("📦 Palabra archivada")
                         time.sleep(0.5)
-                        st.rerun()
+                        rerun_card()
     
+    logger.debug("Ejecución del fragmento de tarjeta: %.1f ms", (time.perf_counter() - fragment_started) * 1000)
+
 
 def handle_text_analysis_mode(db: VocabularyDB, selected_category: str):
     """Función para manejar el modo análisis de texto"""
@@ -2372,14 +2440,15 @@ def handle_text_analysis_mode(db: VocabularyDB, selected_category: str):
         st.session_state.analyzed_text = input_text.strip()
         chinese_count = len([c for c in input_text.strip() if '\u4e00' <= c <= '\u9fff'])
         
-        with st.spinner(f"🔄 Analizando {chinese_count} caracteres chinos..."):
-            progress_bar = st.progress(0)
-            st.session_state.analysis_result = analyze_chinese_text(input_text.strip())
-            progress_bar.progress(100)
-        st.rerun()
+        progress_bar = st.progress(0.0, text=f"🔄 Analizando {chinese_count} caracteres chinos...")
+        st.session_state.analysis_result = stream_text_analysis(
+            input_text.strip(),
+            progress_callback=lambda done, total: progress_bar.progress(done / total if total else 1.0, text=f"🔄 {done}/{total}")
+        )
+        progress_bar.empty()
     
     # Procesar análisis de categoría
-    if analyze_category_button:
+    elif analyze_category_button:
         # Obtener palabras de la categoría actual
         words = db.get_words_by_category(selected_category, review_only=False, archived_only=False)
         
@@ -2395,16 +2464,17 @@ def handle_text_analysis_mode(db: VocabularyDB, selected_category: str):
             category_text = ''.join(sorted(unique_chars))
             chinese_count = len(unique_chars)
             
-            with st.spinner(f"🔄 Analizando {chinese_count} caracteres únicos de la categoría '{selected_category}'..."):
-                progress_bar = st.progress(0)
-                st.session_state.analysis_result = analyze_chinese_text(category_text)
-                progress_bar.progress(100)
-            st.rerun()
+            progress_bar = st.progress(0.0, text=f"🔄 Analizando {chinese_count} caracteres únicos de la categoría '{selected_category}'...")
+            st.session_state.analysis_result = stream_text_analysis(
+                category_text,
+                progress_callback=lambda done, total: progress_bar.progress(done / total if total else 1.0, text=f"🔄 {done}/{total}")
+            )
+            progress_bar.empty()
         else:
             st.warning(f"⚠️ No hay caracteres chinos en la categoría '{selected_category}'")
     
-    # Mostrar resultados
-    if st.session_state.analysis_result:
+    # Mostrar resultados (si no se acaban de mostrar mientras se analizaban)
+    elif st.session_state.analysis_result:
         display_text_analysis(st.session_state.analysis_result)
 
 def get_pinyin_for_text(text):
@@ -2431,116 +2501,126 @@ def get_pinyin_for_text(text):
             return f"[Pinyin no disponible para: {text}]"
 
 
-def analyze_chinese_text(text):
-    """Analizar texto chino con procesamiento optimizado"""
-    chinese_chars = [char for char in text if '\u4e00' <= char <= '\u9fff']
+def upcoming_random_words(db: VocabularyDB, count: int) -> List[Dict]:
+    """Próximas palabras del orden aleatorio, sorteadas por adelantado (al menos count si hay palabras).
+
+    Se guardan en la sesión junto con el filtro y la generación de la base de datos: si
+    cualquiera de ellos cambia, se descartan y se vuelven a sortear.
+    """
+    key = (st.session_state.current_category, st.session_state.review_filter_state,
+           st.session_state.archived_filter, db.generation)
+    upcoming = st.session_state.get('upcoming_random_words')
+    if upcoming is None or upcoming['key'] != key:
+        upcoming = {'key': key, 'words': []}
+        st.session_state.upcoming_random_words = upcoming
     
+    words = upcoming['words']
+    while len(words) < count:
+        word = db.get_random_word(*key[:3])
+        if word is None:
+            break
+        words.append(word)
+    return words
+
+
+def next_random_word(db: VocabularyDB) -> Optional[Dict]:
+    """Siguiente palabra del orden aleatorio: la primera de las ya sorteadas (y precargadas)"""
+    words = upcoming_random_words(db, 1)
+    return words.pop(0) if words else None
+
+
+def prefetch_upcoming_words(db: VocabularyDB, count: int = PREFETCH_WORDS):
+    """Precargar en segundo plano los trazos de las próximas palabras del modo escritura"""
+    words = st.session_state.current_category_words or db.get_words_by_category(
+        st.session_state.current_category,
+        st.session_state.review_filter_state,
+        st.session_state.archived_filter)
+    if not words:
+        return
+    
+    if st.session_state.random_order:
+        # Las próximas palabras aleatorias se sortean por adelantado y next_random_word() las consume
+        upcoming = upcoming_random_words(db, count)
+    else:
+        start = st.session_state.current_word_index
+        upcoming = [words[(start + i) % len(words)] for i in range(min(count, len(words)))]
+    
+    get_prefetcher().prefetch(
+        char for word in upcoming for char in word['chinese'] if '\u4e00' <= char <= '\u9fff'
+    )
+
+
+def build_analysis_result(text):
+    """Crear el resultado de un análisis de texto.
+
+    Solo guarda referencias (los caracteres); sus datos se resuelven en la caché compartida
+    de character_data, así st.session_state no retiene datos por cada sesión.
+    """
     # Obtener pinyin del texto completo
     full_pinyin = get_pinyin_for_text(text)
     
-    analysis_result = {
+    return {
         'original_text': text,
         'full_pinyin': full_pinyin,
-        'characters': [],
+        'characters': [char for char in text if '\u4e00' <= char <= '\u9fff'],
         'non_chinese_chars': [char for char in text if not ('\u4e00' <= char <= '\u9fff')]
     }
+
+
+def analyze_chinese_text(text, progress_callback=None, result_callback=None):
+    """Analizar texto chino con procesamiento optimizado.
+
+    progress_callback recibe (caracteres únicos consultados, total) y result_callback
+    (carácter, datos) en cuanto llega cada uno.
+    """
+    analysis_result = build_analysis_result(text)
+    # Consultar cada carácter único una sola vez con el motor asíncrono
+    fetch_characters_with_progress(analysis_result['characters'], progress_callback, result_callback)
+    return analysis_result
+
+
+def stream_text_analysis(text, progress_callback=None):
+    """Analizar un texto mostrando cada carácter en su lugar de la cuadrícula en cuanto llegan sus datos"""
+    analysis_result = build_analysis_result(text)
+    slots = display_text_analysis(analysis_result, characters_data={})
     
-    # Procesar caracteres únicos para evitar duplicados
-    unique_chars = list(set(chinese_chars))
-    
-    # Usar threading para acelerar las requests
-    import concurrent.futures
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        future_to_char = {executor.submit(fetch_character_data, char): char for char in unique_chars}
-        char_data_cache = {}
-        
-        for future in concurrent.futures.as_completed(future_to_char):
-            char = future_to_char[future]
-            try:
-                data = future.result()
-                char_data_cache[char] = data
-            except Exception as exc:
-                char_data_cache[char] = {'success': False, 'error': str(exc)}
+    positions = {}
+    for index, character in enumerate(analysis_result['characters']):
+        positions.setdefault(character, []).append(index)
     
-    # Construir resultado final manteniendo el orden original
-    for character in chinese_chars:
-        analysis_result['characters'].append({
-            'character': character,
-            'data': char_data_cache[character]
-        })
+    def on_result(character, data):
+        for index in positions[character]:
+            render_character_card(slots[index], character, data)
     
+    fetch_characters_with_progress(positions, progress_callback, on_result)
     return analysis_result
 
 
-def fetch_character_data(character):
-    """Obtener datos de un carácter chino (misma función que ya tienes)"""
-    try:
-        from urllib.parse import quote
-        import requests
-        import re
-        import base64
-        
-        encoded_char = quote(character)
-        url = f"http://www.strokeorder.info/mandarin.php?q={encoded_char}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        html = response.text
-        
-        # Extraer información
-        pinyin_match = re.search(r'Pinyin & Definition:.*?<[^>]*>([^<]+)', html, re.DOTALL)
-        pinyin = pinyin_match.group(1).strip() if pinyin_match else "N/A"
-        
-        definition_match = re.search(r'Pinyin & Definition:.*?<[^>]*>[^<]+.*?<[^>]*>([^<]+)', html, re.DOTALL)
-        definition = definition_match.group(1).strip() if definition_match else "N/A"
+def render_character_card(slot, character, data):
+    """Dibujar la tarjeta de un carácter (o su marcador de carga si data es None) dentro de un st.empty"""
+    with slot.container():
+        if data is None:
+            st.markdown(f"<h3 class='stroke-chinese-word' style='text-align: center; color: #bdc3c7;'>{character} ⏳</h3>", unsafe_allow_html=True)
+        elif data['success'] and data['image_url']:
+            st.markdown(f"<h3 class='stroke-chinese-word' style='text-align: center; color: #1f77b4;'>{character} {data['pinyin']} {data['definition']}</h3>", unsafe_allow_html=True)
+            st.markdown(
+                f'<div style="text-align: center;"><img src="{data["image_url"]}" style="max-width: 100%; border: 2px solid #e0e0e0; border-radius: 10px;"></div>',
+                unsafe_allow_html=True
+            )
+        else:
+            st.warning(f"⚠️ Orden de trazos no disponible para {character}")
 
-        gif_match = re.search(r'src="([^"]*\.gif[^"]*)"', html)
-        gif_url = None
-        
-        if gif_match:
-            gif_url = gif_match.group(1)
-            if gif_url.startswith('/'):
-                gif_url = 'http://www.strokeorder.info' + gif_url
-            elif not gif_url.startswith('http'):
-                gif_url = 'http://www.strokeorder.info/' + gif_url
-        
-        strokes_match = re.search(r'Strokes:.*?(\d+)', html, re.DOTALL)
-        strokes = strokes_match.group(1) if strokes_match else "N/A"
-        
-        radical_match = re.search(r'Radical:.*?<[^>]*>([^<]+)', html, re.DOTALL)
-        radical = radical_match.group(1).strip() if radical_match else "N/A"
-        
-        # Descargar GIF
-        gif_base64 = None
-        if gif_url:
-            try:
-                gif_response = requests.get(gif_url, headers=headers, timeout=10)
-                gif_response.raise_for_status()
-                gif_base64 = base64.b64encode(gif_response.content).decode()
-            except:
-                pass
-        
-        return {
-            'gif_url': gif_url,
-            'gif_base64': gif_base64,
-            'pinyin': pinyin,
-            'definition': definition,
-            'strokes': strokes,
-            'radical': radical,
-            'success': True
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
-        }
 
+def display_text_analysis(analysis_result, characters_data=None):
+    """Mostrar los resultados del análisis de texto.
 
-def display_text_analysis(analysis_result):
-    """Mostrar los resultados del análisis de texto"""
+    characters_data (carácter -> datos) se resuelve solo con fuentes locales si no se indica,
+    así redibujar no consulta la red; los caracteres que falten en characters_data se muestran
+    como pendientes. Devuelve un st.empty por carácter, en el orden del texto, para poder
+    actualizar cada tarjeta.
+    """
+    if characters_data is None:
+        characters_data = lookup_characters(analysis_result['characters'])
     
     # Mostrar el texto original y su pinyin
     st.markdown(f"""
@@ -2565,6 +2645,7 @@ def display_text_analysis(analysis_result):
         """, unsafe_allow_html=True)
     
     # Mostrar cada carácter usando columnas como en modo escritura
+    slots = []
     if analysis_result['characters']:
         st.markdown("### ✍️ Análisis de Caracteres y Orden de Trazos")
         
@@ -2574,19 +2655,13 @@ def display_text_analysis(analysis_result):
             chunk = analysis_result['characters'][i:i + chars_per_row]
             cols = st.columns(len(chunk))
             
-            for j, char_info in enumerate(chunk):
-                character = char_info['character']
-                data = char_info['data']
-                
+            for j, character in enumerate(chunk):
                 with cols[j]:
-                    if data['success'] and data['gif_base64']:
-                        st.markdown(f"<h3 class='stroke-chinese-word' style='text-align: center; color: #1f77b4;'>{character} {data['pinyin']} {data['definition']}</h3>", unsafe_allow_html=True)
-                        st.markdown(
-                            f'<div style="text-align: center;"><img src="data:image/gif;base64,{data["gif_base64"]}" style="max-width: 100%; border: 2px solid #e0e0e0; border-radius: 10px;"></div>',
-                            unsafe_allow_html=True
-                        )
-                    else:
-                        st.warning(f"⚠️ Orden de trazos no disponible para {character}")
+                    slot = st.empty()
+                render_character_card(slot, character, characters_data.get(character))
+                slots.append(slot)
+    
+    return slots
 
 if __name__ == "__main__":
     main()
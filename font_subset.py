@@ -0,0 +1,287 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import sqlite3
+import string
+import subprocess
+import sys
+import threading
+import urllib.request
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Fuentes completas (no se sirven) y subconjuntos WOFF2 servidos desde static/fonts
+FONT_SOURCE_DIR = os.path.join(BASE_DIR, "fonts")
+FONT_OUTPUT_DIR = os.path.join(BASE_DIR, "static", "fonts")
+MANIFEST_NAME = "manifest.json"
+# Salida de la última regeneración lanzada desde la app (fuera de static/: no se sirve)
+SUBSET_LOG_PATH = os.path.join(BASE_DIR, "font_subset.log")
+# Fuentes del selector "Tipo de Letra": nombre del subconjunto (ver static/flashcards.css) -> archivos fuente aceptados
+FONTS = {
+    'KaiTi': ['KaiTi.ttf', 'KaiTi.otf', 'KaiTi.woff2'],
+    'NotoSansSC': ['NotoSansSC-VF.ttf', 'NotoSansSC-Regular.otf', 'NotoSansSC.ttf'],
+    'NotoSerifSC': ['NotoSerifSC-VF.ttf', 'NotoSerifSC-Regular.otf', 'NotoSerifSC.ttf'],
+    'Libertine': ['Libertine.woff2', 'LinLibertine_R.ttf', 'LinLibertine_R.otf'],
+    'Montserrat': ['Montserrat-VF.ttf', 'Montserrat-Medium.ttf', 'Montserrat.woff2'],
+}
+# Descarga de las fuentes completas (--download): archivo con el que se guarda -> URL.
+# Las URLs apuntan a versiones publicadas (etiquetas), no a ramas, para que cada imagen use
+# las mismas fuentes; KaiTi y Libertine vienen del servidor del respaldo remoto de flashcards.css
+NOTO_CJK_URL = "https://raw.githubusercontent.com/notofonts/noto-cjk"
+FONT_URLS = {
+    'KaiTi.woff2': "https://munihuayucachi.servicios.gob.pe/eeefb172-d17a-4a1e-8276-5ea006fc7770/fonts/KaiTi.woff2",
+    'Libertine.woff2': "https://munihuayucachi.servicios.gob.pe/eeefb172-d17a-4a1e-8276-5ea006fc7770/fonts/Libertine.woff2",
+    'NotoSansSC-VF.ttf': f"{NOTO_CJK_URL}/Sans2.004/Sans/Variable/TTF/Subset/NotoSansSC-VF.ttf",
+    'NotoSerifSC-VF.ttf': f"{NOTO_CJK_URL}/Serif2.002/Serif/Variable/TTF/Subset/NotoSerifSC-VF.ttf",
+    'Montserrat-Medium.ttf': "https://raw.githubusercontent.com/JulietaUla/Montserrat/v7.222/fonts/ttf/Montserrat-Medium.ttf",
+}
+# Caracteres que siempre se incluyen: ASCII, pinyin con tonos y puntuación china
+BASE_CHARACTERS = (
+    string.printable.strip()
+    + "āáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜüĀÁǍÀĒÉĚÈĪÍǏÌŌÓǑÒŪÚǓÙǕǗǙǛÜ"
+    + "，。！？、；：“”‘’（）《》【】…—·"
+)
+# Ideogramas CJK y puntuación china / de ancho completo
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+# Mazos de texto que también se estudian con la app y los textos de la propia interfaz
+DECK_PATTERNS = ["*.csv", "*.txt", "flashcards.py"]
+
+
+def extract_characters(texts: Iterable[str]) -> Set[str]:
+    """Caracteres CJK presentes en los textos"""
+    characters = set()
+    for text in texts:
+        if text:
+            characters.update(CJK_PATTERN.findall(text))
+    return characters
+
+
+def collect_characters(db_path: str = os.path.join(BASE_DIR, "vocabulary.db"), deck_dir: str = BASE_DIR) -> Set[str]:
+    """Reunir los caracteres usados por el vocabulario, los mazos y la interfaz"""
+    characters = set()
+
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT chinese, explanation, literal_translation FROM vocabulary")
+            characters.update(extract_characters(text for row in rows for text in row))
+        finally:
+            conn.close()
+
+    for pattern in DECK_PATTERNS:
+        for path in glob.glob(os.path.join(deck_dir, pattern)):
+            with open(path, "r", encoding="utf-8", errors="ignore") as file:
+                characters.update(extract_characters(file))
+
+    return characters
+
+
+def load_manifest(output_dir: str = FONT_OUTPUT_DIR) -> Dict:
+    """Leer el manifiesto de la última generación: caracteres incluidos y fuente de cada subconjunto"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'characters': "", 'fonts': {}}
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _find_source(name: str, source_dir: str) -> Optional[str]:
+    """Primer archivo fuente disponible para una fuente del selector"""
+    for filename in FONTS[name]:
+        path = os.path.join(source_dir, filename)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def download_sources(source_dir: str = FONT_SOURCE_DIR) -> List[str]:
+    """Descargar las fuentes completas de FONT_URLS que aún no están en source_dir"""
+    os.makedirs(source_dir, exist_ok=True)
+    downloaded = []
+    for filename, url in FONT_URLS.items():
+        path = os.path.join(source_dir, filename)
+        if os.path.exists(path):
+            continue
+        tmp_path = f"{path}.tmp"
+        urllib.request.urlretrieve(url, tmp_path)
+        os.replace(tmp_path, path)
+        downloaded.append(filename)
+    return downloaded
+
+
+def _source_signature(path: str) -> str:
+    """Identificar la versión de un archivo fuente sin leerlo entero"""
+    stat = os.stat(path)
+    return f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def build_subsets(
+    characters: Set[str],
+    source_dir: str = FONT_SOURCE_DIR,
+    output_dir: str = FONT_OUTPUT_DIR,
+    force: bool = False
+) -> List[str]:
+    """Generar los subconjuntos WOFF2 que falten o estén desactualizados.
+
+    Sin force, los caracteres de la generación anterior se conservan (el conjunto solo crece)
+    y una fuente se regenera únicamente si aparecen caracteres nuevos o cambia su archivo fuente.
+    Devuelve los nombres de las fuentes generadas. Requiere fontTools y brotli.
+    """
+    from fontTools import subset
+
+    manifest = load_manifest(output_dir)
+    previous = set(manifest['characters'])
+    wanted = set(characters) if force else previous | set(characters)
+    text = "".join(sorted(wanted | set(BASE_CHARACTERS)))
+
+    os.makedirs(output_dir, exist_ok=True)
+    built = []
+    fonts = {}
+    for name in FONTS:
+        source = _find_source(name, source_dir)
+        if source is None:
+            logger.warning("Fuente %s no encontrada en %s; se omite", name, source_dir)
+            continue
+
+        signature = _source_signature(source)
+        fonts[name] = signature
+        output = os.path.join(output_dir, f"{name}.woff2")
+        if (not force and wanted <= previous and manifest['fonts'].get(name) == signature
+                and os.path.exists(output)):
+            continue
+
+        options = subset.Options()
+        options.flavor = "woff2"
+        options.layout_features = ["*"]
+        font = subset.load_font(source, options)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(text=text)
+        subsetter.subset(font)
+        # Escribir en un temporal y renombrar: nunca se sirve una fuente a medias
+        tmp_output = f"{output}.tmp"
+        subset.save_font(font, tmp_output, options)
+        os.replace(tmp_output, output)
+        built.append(name)
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as file:
+        json.dump({'characters': "".join(sorted(wanted)), 'fonts': fonts}, file, ensure_ascii=False)
+    return built
+
+
+def missing_characters(db_path: str = os.path.join(BASE_DIR, "vocabulary.db"), output_dir: str = FONT_OUTPUT_DIR) -> Set[str]:
+    """Caracteres del vocabulario y los mazos que aún no están en los subconjuntos"""
+    return collect_characters(db_path) - set(load_manifest(output_dir)['characters'])
+
+
+class FontSubsetJob:
+    """Regenera los subconjuntos en un proceso aparte, lanzado desde el panel de administración.
+
+    fontTools carga cada fuente completa en memoria; fuera del proceso de Streamlit, si el
+    sistema termina el proceso por falta de memoria, la aplicación sigue en pie. Solo corre
+    una regeneración a la vez y su salida queda en SUBSET_LOG_PATH.
+    """
+
+    def __init__(self, source_dir: str = FONT_SOURCE_DIR, output_dir: str = FONT_OUTPUT_DIR):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+
+    def available(self) -> bool:
+        """Indicar si hay fuentes completas y fontTools para regenerar"""
+        if not any(_find_source(name, self.source_dir) for name in FONTS):
+            return False
+        try:
+            import fontTools.subset  # noqa: F401
+            import brotli  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def start(self) -> bool:
+        """Lanzar la regeneración; devuelve False si ya hay una en curso"""
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return False
+            with open(SUBSET_LOG_PATH, "wb") as log:
+                self._process = subprocess.Popen(
+                    [sys.executable, os.path.abspath(__file__),
+                     "--source-dir", self.source_dir, "--output-dir", self.output_dir],
+                    cwd=BASE_DIR, stdout=log, stderr=subprocess.STDOUT
+                )
+            return True
+
+    def status(self) -> Optional[int]:
+        """Código de salida de la última regeneración, o None si no se lanzó ninguna o sigue en curso"""
+        with self._lock:
+            return None if self._process is None else self._process.poll()
+
+    def running(self) -> bool:
+        """Indicar si hay una regeneración en curso"""
+        with self._lock:
+            return self._process is not None and self._process.poll() is None
+
+
+_default_job = None
+_default_job_lock = threading.Lock()
+
+
+def get_font_subset_job() -> FontSubsetJob:
+    """Instancia de FontSubsetJob compartida por todo el proceso"""
+    global _default_job
+    with _default_job_lock:
+        if _default_job is None:
+            _default_job = FontSubsetJob()
+        return _default_job
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Build WOFF2 font subsets with the characters used by the vocabulary.")
+    parser.add_argument(
+        "--db", type=str, default=os.path.join(BASE_DIR, "vocabulary.db"),
+        help="Vocabulary database to scan"
+    )
+    parser.add_argument(
+        "--decks", type=str, default=BASE_DIR,
+        help="Directory with .csv/.txt decks to scan"
+    )
+    parser.add_argument(
+        "--source-dir", type=str, default=FONT_SOURCE_DIR,
+        help="Directory with the full font files"
+    )
+    parser.add_argument(
+        "--output-dir", type=str, default=FONT_OUTPUT_DIR,
+        help="Directory for the WOFF2 subsets"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Rebuild every subset from the current character set only"
+    )
+    parser.add_argument(
+        "--download", action="store_true",
+        help="Download the missing full font files into --source-dir first"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    if args.download:
+        downloaded = download_sources(args.source_dir)
+        print(f"✓ Fuentes descargadas: {', '.join(downloaded) or 'ninguna (ya estaban)'}")
+    if not os.path.isdir(args.source_dir):
+        print(f"Error: Font directory '{args.source_dir}' does not exist.")
+        exit(1)
+
+    characters = collect_characters(args.db, args.decks)
+    built = build_subsets(characters, args.source_dir, args.output_dir, args.force)
+    print(f"✓ {len(characters)} caracteres; subconjuntos generados: {', '.join(built) or 'ninguno (sin cambios)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+# Archivos servidos por Streamlit desde ./static (server.enableStaticServing en .streamlit/config.toml)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+# Subcarpeta de las animaciones de trazos (GIF de strokeorder.info y SVG de la base local)
+STROKES_SUBDIR = "strokes"
+# Tamaño máximo de la subcarpeta; se borran primero los archivos usados hace más tiempo
+MAX_STROKES_BYTES = 32 * 1024 * 1024
+
+
+class StaticAssetStore:
+    """Archivos de static/ con nombre por hash de contenido, acotados en tamaño con expulsión LRU.
+
+    Como el nombre depende solo del contenido, un archivo publicado nunca cambia: el navegador
+    puede conservarlo y revalidarlo con su ETag, y el mismo contenido se guarda una sola vez
+    aunque lo pidan varias sesiones.
+    """
+
+    def __init__(self, subdir: str = STROKES_SUBDIR, max_bytes: int = MAX_STROKES_BYTES):
+        self.directory = os.path.join(STATIC_DIR, subdir)
+        self.url_prefix = f"{STATIC_URL}/{subdir}"
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_existing()
+
+    def _load_existing(self):
+        """Registrar los archivos que ya existen, del más antiguo al más reciente"""
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                # Restos de una escritura interrumpida
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self.total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def publish(self, content: bytes, extension: str) -> str:
+        """Guardar bytes (si aún no existen) y devolver su URL"""
+        name = f"{hashlib.sha256(content).hexdigest()[:32]}.{extension}"
+        with self._lock:
+            if name in self._files:
+                self._files.move_to_end(name)
+            else:
+                os.makedirs(self.directory, exist_ok=True)
+                # Escribir en un temporal y renombrar: nunca se sirve un archivo a medias
+                path = os.path.join(self.directory, name)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as file:
+                    file.write(content)
+                os.replace(tmp_path, path)
+                self._files[name] = len(content)
+                self.total_bytes += len(content)
+                self._evict()
+        return f"{self.url_prefix}/{name}"
+
+    def contains(self, url: str) -> bool:
+        """Indicar si la URL sigue publicada, marcándola como usada recientemente"""
+        name = url.rsplit("/", 1)[-1]
+        with self._lock:
+            if name not in self._files:
+                return False
+            self._files.move_to_end(name)
+            return True
+
+    def _evict(self):
+        """Borrar los archivos menos usados hasta volver a max_bytes (siempre se conserva el último)"""
+        while self.total_bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def usage(self) -> Dict:
+        """Archivos y bytes ocupados, y el máximo permitido"""
+        with self._lock:
+            return {'files': len(self._files), 'bytes': self.total_bytes, 'max_bytes': self.max_bytes}
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_asset_store() -> StaticAssetStore:
+    """Instancia de StaticAssetStore compartida por todo el proceso"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = StaticAssetStore()
+        return _default_store
+
+
+def publish_asset(content: bytes, extension: str) -> str:
+    """Publicar una animación de trazos en static/ y devolver su URL"""
+    return get_asset_store().publish(content, extension)
+
+
+def asset_available(url: str) -> bool:
+    """Indicar si una URL publicada con publish_asset todavía existe"""
+    return get_asset_store().contains(url)
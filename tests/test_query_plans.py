@@ -0,0 +1,106 @@
+"""Las consultas de VocabularyDB no deben recorrer la tabla vocabulary completa.
+
+Se ejecutan todos los métodos públicos sobre una base temporal, se capturan las
+sentencias reales con set_trace_callback y se revisa su EXPLAIN QUERY PLAN.
+"""
+import io
+import sqlite3
+
+import pytest
+
+import flashcards
+from flashcards import VocabularyDB
+
+ALL = "Todas las categorías"
+
+# Métodos públicos que no consultan el vocabulario
+NOT_QUERIES = {"close", "init_database", "transaction"}
+
+CSV = "chinese|pinyin|spanish|category\n你好|nǐ hǎo|Hola|Saludos y Cortesía\n书|shū|Libro|Aula\n"
+
+# Una llamada por método público; cada lambda recibe la base de datos
+CALLS = {
+    "get_schema_version": lambda db: db.get_schema_version(),
+    "toggle_word_archived": lambda db: db.toggle_word_archived("你好", "nǐ hǎo"),
+    "get_word_archived_status": lambda db: db.get_word_archived_status("你好", "nǐ hǎo"),
+    "get_archived_count": lambda db: db.get_archived_count("Números"),
+    "toggle_word_review": lambda db: db.toggle_word_review("一", "yī"),
+    "get_word_review_status": lambda db: db.get_word_review_status("一", "yī"),
+    "get_review_words_by_category": lambda db: (
+        db.get_review_words_by_category("Números"), db.get_review_words_by_category(ALL)
+    ),
+    "get_review_count": lambda db: db.get_review_count(),
+    "get_category_stats": lambda db: db.get_category_stats(),
+    "get_categories": lambda db: db.get_categories(),
+    "get_words_by_category": lambda db: [
+        db.get_words_by_category(category, review_only, archived_only)
+        for category in ("Números", ALL)
+        for review_only, archived_only in ((False, False), (True, False), (False, True))
+    ],
+    "get_random_word": lambda db: [
+        db.get_random_word(category, review_only, archived_only)
+        for category in ("Números", ALL)
+        for review_only, archived_only in ((False, False), (True, False), (False, True))
+    ],
+    "add_word": lambda db: db.add_word("书", "shū", "Libro", "Aula"),
+    "update_word": lambda db: db.update_word(1, "你好", "nǐ hǎo", "Hola", "Saludos y Cortesía", "saludo"),
+    "delete_word": lambda db: db.delete_word(2),
+    "get_all_words": lambda db: db.get_all_words(),
+    "import_from_csv": lambda db: db.import_from_csv(CSV),
+    "import_csv_stream": lambda db: db.import_csv_stream(io.BytesIO(CSV.encode("utf-8"))),
+    "set_config": lambda db: db.set_config("clave", "valor"),
+    "get_config": lambda db: db.get_config("clave"),
+    "save_last_flashcard": lambda db: db.save_last_flashcard({"chinese": "一"}, 2),
+    "get_last_flashcard": lambda db: db.get_last_flashcard(),
+    "clear_last_flashcard": lambda db: db.clear_last_flashcard(),
+}
+
+
+@pytest.fixture
+def traced_db(tmp_path, monkeypatch):
+    """VocabularyDB temporal que registra cada sentencia ejecutada por sus conexiones"""
+    statements = []
+    open_connection = VocabularyDB._open_connection
+
+    def traced_open(self):
+        conn = open_connection(self)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(VocabularyDB, "_open_connection", traced_open)
+    db = VocabularyDB(str(tmp_path / "vocabulary.db"))
+    # Las migraciones no son consultas de la aplicación
+    statements.clear()
+    yield db, statements
+    db.close()
+
+
+def test_every_public_method_is_checked():
+    public = {
+        name for name, value in vars(VocabularyDB).items()
+        if not name.startswith("_") and callable(getattr(value, "__func__", value))
+    }
+    assert public - NOT_QUERIES == set(CALLS)
+
+
+@pytest.mark.parametrize("method", sorted(CALLS))
+def test_no_full_table_scan(traced_db, method):
+    db, statements = traced_db
+    CALLS[method](db)
+
+    # BEGIN, COMMIT y PRAGMA no tienen plan de consulta
+    queries = [
+        sql for sql in statements
+        if sql.lstrip().split(None, 1)[0].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE")
+    ]
+
+    explain = sqlite3.connect(db.db_path)
+    try:
+        for sql in queries:
+            for row in explain.execute(f"EXPLAIN QUERY PLAN {sql}"):
+                detail = row[-1]
+                assert not (detail.startswith("SCAN vocabulary") and "INDEX" not in detail), (
+                    f"{method}: {detail}\n{sql}"
+                )
+    finally:
+        explain.close()
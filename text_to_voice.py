@@ -1,40 +1,49 @@
 import asyncio
 import edge_tts
+import io
 from edge_tts import Communicate, list_voices
 from gtts import gTTS
 import os
 import time
-from pydub import AudioSegment
 import argparse
+from audio_assembly import PAUSA_LINEA, PAUSA_REPETICION, StreamingTrackWriter, TrackAssembler
+from tts_cache import DEFAULT_CACHE_DIR, cached_synthesize, configure_tts_cache, get_tts_cache
+from tts_scheduler import MAX_CONCURRENT_SYNTHESIS, SynthesisScheduler, decode_in_order, run_blocking, stream_audio
 
 
 async def generar_audio_chino(
-    texto, archivo_salida, voz="zh-CN-XiaoxiaoNeural", velocidad="-40%"
+    texto, voz="zh-CN-XiaoxiaoNeural", velocidad="-40%"
 ):
     """
     Genera audio en chino con velocidad reducida
 
     Parámetros:
     texto (str): Texto en caracteres chinos
-    archivo_salida (str): Nombre del archivo .mp3
     voz (str): Modelo de voz
     velocidad (str): Velocidad reducida (ej: -40%)
+
+    Returns:
+    bytes: Audio MP3
     """
     # Configurar voz con velocidad reducida
     voz_ajustada = voz
 
     communicate = Communicate(texto, voz_ajustada)
-    await communicate.save(archivo_salida)
+    return await cached_synthesize(
+        "edge", voz_ajustada, "+0%", texto, lambda: stream_audio(communicate)
+    )
 
 
-async def generar_audio_mandarin(texto, archivo_salida, voz_genero="mujer"):
+async def generar_audio_mandarin(texto, voz_genero="mujer"):
     """
     Genera audio en chino mandarín utilizando edge-tts
 
     Parámetros:
     texto (str): Texto en caracteres chinos
-    archivo_salida (str): Nombre del archivo .mp3
     voz_genero (str): 'hombre' para voz masculina, 'mujer' para voz femenina
+
+    Returns:
+    bytes: Audio MP3
     """
     # Seleccionar voz según el género
     if voz_genero == "hombre":
@@ -43,27 +52,39 @@ async def generar_audio_mandarin(texto, archivo_salida, voz_genero="mujer"):
         voz = "zh-CN-XiaoxiaoNeural"  # Voz femenina china (por defecto)
 
     communicate = Communicate(texto, voz, rate="-40%")
-    await communicate.save(archivo_salida)
+    return await cached_synthesize(
+        "edge", voz, "-40%", texto, lambda: stream_audio(communicate)
+    )
 
 
-async def generar_audio_idioma(texto, archivo_salida, idioma):
+async def generar_audio_idioma(texto, idioma):
     """
     Genera audio en el idioma especificado usando edge-tts para español o gTTS para inglés
 
     Parámetros:
     texto (str): Texto en el idioma objetivo
-    archivo_salida (str): Nombre del archivo .mp3
     idioma (str): 'en' para inglés, 'es' para español
+
+    Returns:
+    bytes: Audio MP3
     """
     if idioma == "es":
         # Usar edge-tts para español con voz más natural
         voz = "es-MX-DaliaNeural"  # Voz femenina mexicana natural
         communicate = Communicate(texto, voz, rate="-30%")
-        await communicate.save(archivo_salida)
+        return await cached_synthesize(
+            "edge", voz, "-30%", texto, lambda: stream_audio(communicate)
+        )
     else:
-        # Usar gTTS para inglés (funciona bien)
-        tts = gTTS(text=texto, lang="en", slow=True)
-        tts.save(archivo_salida)
+        # Usar gTTS para inglés (funciona bien); es bloqueante, así que corre en el executor
+        def sintetizar():
+            buffer = io.BytesIO()
+            gTTS(text=texto, lang="en", slow=True).write_to_fp(buffer)
+            return buffer.getvalue()
+
+        return await cached_synthesize(
+            "gtts", "en", "slow", texto, lambda: run_blocking(sintetizar)
+        )
 
 
 def parse_arguments():
@@ -92,6 +113,25 @@ def parse_arguments():
         default="twice",
         help="Repeat the text once or twice",
     )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help="Directory for cached synthesized clips; only changed lines are synthesized again (empty to disable)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=MAX_CONCURRENT_SYNTHESIS,
+        help="Maximum number of clips synthesized at the same time",
+    )
+    parser.add_argument(
+        "--streaming",
+        type=str,
+        choices=["true", "false"],
+        default="true",
+        help="Encode the final track while it is assembled, keeping about one clip in memory (false: build it in memory and export at the end)",
+    )
     return parser.parse_args()
 
 
@@ -102,6 +142,8 @@ async def main():
     target_language = args.language
     voice_gender = args.voice
     repeat = args.repeat
+    streaming = args.streaming == "true"
+    configure_tts_cache(args.cache_dir)
 
     if not os.path.exists(input_file):
         print(f"Error: Input file '{input_file}' does not exist.")
@@ -111,19 +153,28 @@ async def main():
     with open(input_file, "r", encoding="utf-8") as file:
         lines = file.readlines()
 
-    archivo_mandarin = "output_mandarin.mp3"
-    archivo_target = f"output_{target_language}.mp3"
-    final_audio = AudioSegment.silent(duration=0)
+    # En streaming la pista se codifica a medida que se ensambla (ffmpeg arranca con el primer clip)
+    output_filename = f"final_output_{input_file}_{voice_gender}_{repeat}.mp3"
+    final_audio = StreamingTrackWriter(output_filename) if streaming else TrackAssembler()
+    language_name = "inglés" if target_language == "en" else "español"
+    repeticiones = 2 if repeat == "twice" else 1
 
     print(
         f"🎤 Usando voz china: {'masculina' if voice_gender == 'hombre' else 'femenina'}"
     )
 
+    # Enviar a síntesis todos los clips del archivo antes de ensamblar nada.
+    # Cada línea queda como una lista de (tarea, veces que suena, mensaje), en el orden de reproducción
+    scheduler = SynthesisScheduler(args.concurrency)
+    plan = []
+
     for line in lines:
         line = line.strip()
         if not line:  # Saltar líneas vacías
             continue
 
+        clips = []
+
         # Verificar si hay separador |
         if "|" in line:
             # Modo con separador: procesar columnas
@@ -139,128 +190,91 @@ async def main():
             has_translation = len(parts) >= 4 and parts[3].strip()
             texto_traduccion = parts[3].strip() if has_translation else None
 
-            # Generate target language audio (English/Spanish)
-            await generar_audio_idioma(texto_target, archivo_target, target_language)
-
-            # Generate Mandarin audio for the word with selected voice gender
-            await generar_audio_mandarin(texto_mandarin, archivo_mandarin, voice_gender)
-
-            language_name = "inglés" if target_language == "en" else "español"
-            print(
-                f"✔ Audio creado ({language_name}): '{texto_target}' → {archivo_target}"
-            )
-            print(f"✔ Audio creado (mandarín): '{texto_mandarin}' → {archivo_mandarin}")
-
-            # Load the generated audios
-            audio_target = AudioSegment.from_mp3(archivo_target)
-            audio_mandarin = AudioSegment.from_mp3(archivo_mandarin)
-
             # Build the audio sequence: Target language (once) → Mandarin word (twice) → Example (if exists) → Translation (if exists)
-            if repeat == "twice":
-                sequence = (
-                    audio_target
-                    + AudioSegment.silent(duration=1500)
-                    + audio_mandarin
-                    + AudioSegment.silent(duration=1500)
-                    + audio_mandarin
-                )
-            else:
-                sequence = (
-                    audio_target + AudioSegment.silent(duration=1500) + audio_mandarin
-                )
+            clips.append((
+                scheduler.submit(generar_audio_idioma, texto_target, idioma=target_language),
+                1, f"✔ Audio creado ({language_name}): '{texto_target}'"
+            ))
+            clips.append((
+                scheduler.submit(generar_audio_mandarin, texto_mandarin, voz_genero=voice_gender),
+                repeticiones, f"✔ Audio creado (mandarín): '{texto_mandarin}'"
+            ))
 
             # Add example if it exists
             if has_example:
-                archivo_ejemplo = "output_ejemplo.mp3"
-                await generar_audio_mandarin(
-                    texto_ejemplo, archivo_ejemplo, voice_gender
-                )
-                audio_ejemplo = AudioSegment.from_mp3(archivo_ejemplo)
-                if repeat == "twice":
-                    sequence += (
-                        AudioSegment.silent(duration=1500)
-                        + audio_ejemplo
-                        + AudioSegment.silent(duration=1500)
-                        + audio_ejemplo
-                    )
-                else:
-                    sequence += AudioSegment.silent(duration=1500) + audio_ejemplo
-                print(
-                    f"✔ Audio creado (ejemplo): '{texto_ejemplo}' → {archivo_ejemplo}"
-                )
+                clips.append((
+                    scheduler.submit(generar_audio_mandarin, texto_ejemplo, voz_genero=voice_gender),
+                    repeticiones, f"✔ Audio creado (ejemplo): '{texto_ejemplo}'"
+                ))
 
                 # Add translation of example if it exists
                 if has_translation:
-                    archivo_traduccion = f"output_traduccion_{target_language}.mp3"
-                    await generar_audio_idioma(
-                        texto_traduccion, archivo_traduccion, target_language
-                    )
-                    audio_traduccion = AudioSegment.from_mp3(archivo_traduccion)
-                    if repeat == "twice":
-                        sequence += (
-                            AudioSegment.silent(duration=1500)
-                            + audio_traduccion
-                            + AudioSegment.silent(duration=1500)
-                            + audio_traduccion
-                        )
-                    else:
-                        sequence += (
-                            AudioSegment.silent(duration=1500) + audio_traduccion
-                        )
-                    print(
-                        f"✔ Audio creado (traducción): '{texto_traduccion}' → {archivo_traduccion}"
-                    )
-
-            # Add to final audio with longer pause between entries
-            final_audio += sequence + AudioSegment.silent(duration=2500)
+                    clips.append((
+                        scheduler.submit(generar_audio_idioma, texto_traduccion, idioma=target_language),
+                        repeticiones, f"✔ Audio creado (traducción): '{texto_traduccion}'"
+                    ))
 
         else:
             # Modo solo chino: toda la línea es texto chino
             texto_mandarin = line
             voz_dialogo = voice_gender  # Por defecto usar la voz seleccionada
+            mensaje = f"✔ Audio creado (solo mandarín): '{texto_mandarin}'"
 
             # Verificar si es diálogo (A: o B:)
             if line.startswith("A:"):
                 texto_mandarin = line[2:].strip()  # Remover "A:" y espacios
                 voz_dialogo = "mujer"  # A: usa voz femenina
-                print(f"🎭 Diálogo A (voz femenina): '{texto_mandarin}'")
+                mensaje = f"🎭 Diálogo A (voz femenina): '{texto_mandarin}'"
             elif line.startswith("B:"):
                 texto_mandarin = line[2:].strip()  # Remover "B:" y espacios
                 voz_dialogo = "hombre"  # B: usa voz masculina
-                print(f"🎭 Diálogo B (voz masculina): '{texto_mandarin}'")
-
-            # Generate Mandarin audio for the text with appropriate voice
-            await generar_audio_mandarin(texto_mandarin, archivo_mandarin, voz_dialogo)
-            print(
-                f"✔ Audio creado (solo mandarín): '{texto_mandarin}' → {archivo_mandarin}"
-            )
-
-            # Load the generated audio
-            audio_mandarin = AudioSegment.from_mp3(archivo_mandarin)
-
-            # Add the audio once or twice with pause in between for repetition
-            if repeat == "twice":
-                sequence = (
-                    audio_mandarin + AudioSegment.silent(duration=1500) + audio_mandarin
-                )
-            else:
-                sequence = audio_mandarin
-
-            # Add to final audio with longer pause between entries
-            final_audio += sequence + AudioSegment.silent(duration=2500)
+                mensaje = f"🎭 Diálogo B (voz masculina): '{texto_mandarin}'"
+
+            # Mandarin audio for the text with appropriate voice, once or twice
+            clips.append((
+                scheduler.submit(generar_audio_mandarin, texto_mandarin, voz_genero=voz_dialogo),
+                repeticiones, mensaje
+            ))
+
+        plan.append(clips)
+
+    print(f"⏳ {sum(len(clips) for clips in plan)} clips en síntesis ({args.concurrency} a la vez)")
+
+    # Ensamblar en el orden de la entrada a medida que terminan los clips de cada línea
+    # En streaming cada clip se codifica al añadirlo; si no, se guarda por referencia y la pista se copia una sola vez al exportar
+    audios = decode_in_order(tarea for clips in plan for tarea, _, _ in clips)
+    for clips in plan:
+        primero = True
+        for _, veces, mensaje in clips:
+            audio = await anext(audios)
+            print(mensaje)
+            for _ in range(veces):
+                if not primero:
+                    final_audio.add_silence(PAUSA_REPETICION)
+                final_audio.add(audio)
+                primero = False
+
+        # Add to final audio with longer pause between entries
+        final_audio.add_silence(PAUSA_LINEA)
 
     # Save the final audio with pauses
-    final_audio.export(
-        f"final_output_{input_file}_{voice_gender}_{repeat}.mp3", format="mp3"
-    )
+    if streaming:
+        final_audio.close()
+    else:
+        final_audio.render().export(output_filename, format="mp3")
     print(
-        f"✔ Audio final con pausas creado: 'final_output_{input_file}_{voice_gender}_{repeat}.mp3'"
+        f"✔ Audio final con pausas creado: '{output_filename}'"
     )
     print(
         f"🎤 Voz utilizada: {'masculina' if voice_gender == 'hombre' else 'femenina'}"
     )
     print(f"🔁 Repetición: {'una vez' if repeat == 'once' else 'dos veces'}")
 
+    cache = get_tts_cache()
+    if cache:
+        usage = cache.usage()
+        print(f"💾 Caché de voz: {usage['hits']} clips reutilizados, {usage['misses']} sintetizados")
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+# Clips sintetizados por ttv.py y text_to_voice.py, reutilizados entre ejecuciones
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tts_cache")
+# Tamaño máximo de la caché; se borran primero los clips usados hace más tiempo
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+# Los clips ya llegan comprimidos en MP3 desde edge-tts y gTTS: se guardan tal cual
+CLIP_EXTENSION = "mp3"
+
+
+def clip_key(engine: str, voice: str, rate: str, text: str) -> str:
+    """Clave de un clip: hash de todo lo que determina el audio sintetizado"""
+    material = "\0".join((engine, voice, rate, text))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """Clips de voz con nombre por hash de (motor, voz, velocidad, texto), acotados en tamaño con expulsión LRU.
+
+    Al reconstruir un mazo solo se sintetizan las líneas cuyo texto, voz o velocidad cambiaron;
+    el resto se lee del disco. El orden LRU se guarda en la fecha de modificación de cada clip,
+    así que sobrevive entre ejecuciones.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        self.directory = cache_dir
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_existing()
+
+    def _load_existing(self):
+        """Registrar los clips que ya existen, del usado hace más tiempo al más reciente"""
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                # Restos de una escritura interrumpida
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self.total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Bytes del clip, o None si no está en la caché"""
+        name = f"{key}.{CLIP_EXTENSION}"
+        with self._lock:
+            if name not in self._files:
+                self.misses += 1
+                return None
+            self._files.move_to_end(name)
+            self.hits += 1
+        try:
+            with open(self._path(name), "rb") as file:
+                content = file.read()
+            # Marcar el clip como usado recientemente para las próximas ejecuciones
+            os.utime(self._path(name))
+        except FileNotFoundError:
+            # Borrado por otra ejecución que comparte la caché
+            with self._lock:
+                size = self._files.pop(name, None)
+                if size is not None:
+                    self.total_bytes -= size
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return content
+
+    def put(self, key: str, content: bytes):
+        """Guardar un clip (si aún no existe)"""
+        if not content:
+            return
+        name = f"{key}.{CLIP_EXTENSION}"
+        with self._lock:
+            if name in self._files:
+                self._files.move_to_end(name)
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            # Escribir en un temporal y renombrar: otra ejecución nunca lee un clip a medias
+            path = self._path(name)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+            self._files[name] = len(content)
+            self.total_bytes += len(content)
+            self._evict()
+
+    def _evict(self):
+        """Borrar los clips menos usados hasta volver a max_bytes (siempre se conserva el último)"""
+        while self.total_bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def usage(self) -> Dict:
+        """Clips y bytes ocupados, máximo permitido y aciertos/fallos de esta ejecución"""
+        with self._lock:
+            return {
+                'files': len(self._files), 'bytes': self.total_bytes, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def configure_tts_cache(cache_dir: Optional[str] = DEFAULT_CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+    """Elegir la carpeta de la caché compartida por el proceso; con cache_dir vacío se desactiva"""
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = TTSCache(cache_dir, max_bytes) if cache_dir else None
+
+
+def get_tts_cache() -> Optional[TTSCache]:
+    """Caché compartida por todo el proceso, o None si está desactivada"""
+    return _default_cache
+
+
+async def cached_synthesize(
+    engine: str,
+    voice: str,
+    rate: str,
+    text: str,
+    synthesize: Callable[[], Awaitable[bytes]]
+) -> bytes:
+    """Bytes MP3 del clip desde la caché, o sintetizados con synthesize() y guardados"""
+    cache = get_tts_cache()
+    key = clip_key(engine, voice, rate, text)
+    content = cache.get(key) if cache else None
+    if content is not None:
+        return content
+
+    content = await synthesize()
+    if cache:
+        cache.put(key, content)
+    return content
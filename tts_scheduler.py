@@ -0,0 +1,80 @@
+import asyncio
+import functools
+import io
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Iterable
+
+from pydub import AudioSegment
+
+# Síntesis simultáneas como máximo: edge-tts y gTTS son servicios remotos que limitan por cliente
+MAX_CONCURRENT_SYNTHESIS = 6
+# Clips decodificados por adelantado durante el ensamblado: acota el PCM en memoria
+DECODE_AHEAD = 8
+
+
+async def run_blocking(function, *args, **kwargs):
+    """Ejecutar una llamada bloqueante (p. ej. gTTS) en el executor sin frenar el bucle de eventos"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(function, *args, **kwargs))
+
+
+async def stream_audio(communicate) -> bytes:
+    """Reunir en memoria los fragmentos de audio que envía edge-tts, sin pasar por el disco"""
+    chunks = []
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            chunks.append(chunk["data"])
+    return b"".join(chunks)
+
+
+def decode_clip(content: bytes) -> AudioSegment:
+    """Decodificar un MP3 en memoria.
+
+    Indicar el códec evita la consulta previa a ffprobe: cada clip se decodifica con
+    un único proceso de ffmpeg que lee por stdin.
+    """
+    return AudioSegment.from_file(io.BytesIO(content), format="mp3", codec="mp3")
+
+
+class SynthesisScheduler:
+    """Envía todos los clips de un archivo de entrada a la vez y los sintetiza con concurrencia acotada.
+
+    submit() devuelve enseguida una tarea con los bytes MP3 del clip; el ensamblado los
+    decodifica con decode_in_order() en el orden de la entrada, así que el audio final no
+    depende del orden en que terminen las síntesis.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_SYNTHESIS):
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    def submit(self, generate: Callable[..., Awaitable[bytes]], *args, **kwargs) -> "asyncio.Task[bytes]":
+        """Programar la síntesis de un clip con una de las funciones generar_audio_*.
+
+        generate(*args, **kwargs) devuelve los bytes MP3; ninguna ejecución escribe
+        archivos intermedios.
+        """
+        return asyncio.ensure_future(self._run(generate, args, kwargs))
+
+    async def _run(self, generate: Callable[..., Awaitable[bytes]], args, kwargs) -> bytes:
+        async with self._semaphore:
+            return await generate(*args, **kwargs)
+
+
+async def decode_in_order(
+    tasks: Iterable["asyncio.Future[bytes]"], ahead: int = DECODE_AHEAD
+) -> AsyncIterator[AudioSegment]:
+    """Decodificar los clips en el orden de tasks, con como mucho `ahead` clips por adelantado.
+
+    Mientras se sintetizan, los clips ocupan solo sus bytes MP3; el PCM, mucho más grande,
+    existe únicamente para la ventana que se está ensamblando.
+    """
+    async def decode(task):
+        return await run_blocking(decode_clip, await task)
+
+    window = deque()
+    for task in tasks:
+        window.append(asyncio.ensure_future(decode(task)))
+        if len(window) >= ahead:
+            yield await window.popleft()
+    while window:
+        yield await window.popleft()
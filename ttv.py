@@ -1,12 +1,15 @@
 import asyncio
 import edge_tts
+import io
 from edge_tts import Communicate, list_voices
 from gtts import gTTS
 import os
 import time
-from pydub import AudioSegment
 import argparse
 import re
+from audio_assembly import PAUSA_LINEA, PAUSA_REPETICION, StreamingTrackWriter, TrackAssembler
+from tts_cache import DEFAULT_CACHE_DIR, cached_synthesize, configure_tts_cache, get_tts_cache
+from tts_scheduler import MAX_CONCURRENT_SYNTHESIS, SynthesisScheduler, decode_in_order, run_blocking, stream_audio
 
 
 # Voice configurations
@@ -23,42 +26,52 @@ FEMALE_VOICES = [
 
 
 async def generar_audio_chino(
-    texto, archivo_salida, voz="zh-CN-XiaoxiaoNeural", velocidad="-20%"
+    texto, voz="zh-CN-XiaoxiaoNeural", velocidad="-20%"
 ):
     """
     Genera audio en chino con velocidad reducida
 
     Parámetros:
     texto (str): Texto en caracteres chinos
-    archivo_salida (str): Nombre del archivo .mp3
     voz (str): Modelo de voz
     velocidad (str): Velocidad reducida (ej: -40%)
+
+    Returns:
+    bytes: Audio MP3
     """
     communicate = Communicate(texto, voz, rate=velocidad)
-    await communicate.save(archivo_salida)
+    return await cached_synthesize(
+        "edge", voz, velocidad, texto, lambda: stream_audio(communicate)
+    )
 
 
-async def generar_audio_mandarin_con_voz(texto, archivo_salida, voz_especifica):
+async def generar_audio_mandarin_con_voz(texto, voz_especifica):
     """
     Genera audio en chino mandarín utilizando una voz específica
 
     Parámetros:
     texto (str): Texto en caracteres chinos
-    archivo_salida (str): Nombre del archivo .mp3
     voz_especifica (str): Voz específica a utilizar
+
+    Returns:
+    bytes: Audio MP3
     """
     communicate = Communicate(texto, voz_especifica, rate="-20%")
-    await communicate.save(archivo_salida)
+    return await cached_synthesize(
+        "edge", voz_especifica, "-20%", texto, lambda: stream_audio(communicate)
+    )
 
 
-async def generar_audio_mandarin(texto, archivo_salida, voz_genero="mujer", rate="-20%"):
+async def generar_audio_mandarin(texto, voz_genero="mujer", rate="-20%"):
     """
     Genera audio en chino mandarín utilizando edge-tts
 
     Parámetros:
     texto (str): Texto en caracteres chinos
-    archivo_salida (str): Nombre del archivo .mp3
     voz_genero (str): 'hombre' para voz masculina, 'mujer' para voz femenina
+
+    Returns:
+    bytes: Audio MP3
     """
     # Seleccionar voz según el género
     if voz_genero == "hombre":
@@ -67,27 +80,39 @@ async def generar_audio_mandarin(texto, archivo_salida, voz_genero="mujer", rate
         voz = "zh-CN-XiaoxiaoNeural"  # Voz femenina china (por defecto)
 
     communicate = Communicate(texto, voz, rate=rate)
-    await communicate.save(archivo_salida)
+    return await cached_synthesize(
+        "edge", voz, rate, texto, lambda: stream_audio(communicate)
+    )
 
 
-async def generar_audio_idioma(texto, archivo_salida, idioma):
+async def generar_audio_idioma(texto, idioma):
     """
     Genera audio en el idioma especificado usando edge-tts para español o gTTS para inglés
 
     Parámetros:
     texto (str): Texto en el idioma objetivo
-    archivo_salida (str): Nombre del archivo .mp3
     idioma (str): 'en' para inglés, 'es' para español
+
+    Returns:
+    bytes: Audio MP3
     """
     if idioma == "es":
         # Usar edge-tts para español con voz más natural
         voz = "es-MX-DaliaNeural"  # Voz femenina mexicana natural
         communicate = Communicate(texto, voz, rate="-30%")
-        await communicate.save(archivo_salida)
+        return await cached_synthesize(
+            "edge", voz, "-30%", texto, lambda: stream_audio(communicate)
+        )
     else:
-        # Usar gTTS para inglés (funciona bien)
-        tts = gTTS(text=texto, lang="en", slow=True)
-        tts.save(archivo_salida)
+        # Usar gTTS para inglés (funciona bien); es bloqueante, así que corre en el executor
+        def sintetizar():
+            buffer = io.BytesIO()
+            gTTS(text=texto, lang="en", slow=True).write_to_fp(buffer)
+            return buffer.getvalue()
+
+        return await cached_synthesize(
+            "gtts", "en", "slow", texto, lambda: run_blocking(sintetizar)
+        )
 
 
 def parse_character_genders(character_genders_str):
@@ -188,6 +213,25 @@ def parse_arguments():
         default="false",
         help="Save each line as a separate file with numbered suffix (1.mp3, 2.mp3, etc.)"
     )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help="Directory for cached synthesized clips; only changed lines are synthesized again (empty to disable)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=MAX_CONCURRENT_SYNTHESIS,
+        help="Maximum number of clips synthesized at the same time"
+    )
+    parser.add_argument(
+        "--streaming",
+        type=str,
+        choices=["true", "false"],
+        default="true",
+        help="Encode the final track while it is assembled, keeping about one clip in memory (false: build it in memory and export at the end)"
+    )
     return parser.parse_args()
 
 
@@ -201,6 +245,8 @@ async def main():
     character_genders_str = args.character_genders
     voice_rate = args.voice_rate
     line_by_line = args.line_by_line == "true"
+    streaming = args.streaming == "true"
+    configure_tts_cache(args.cache_dir)
 
     if not os.path.exists(input_file):
         print(f"Error: Input file '{input_file}' does not exist.")
@@ -222,23 +268,29 @@ async def main():
     with open(input_file, "r", encoding="utf-8") as file:
         lines = file.readlines()
 
-    archivo_mandarin = "output_mandarin.mp3"
-    archivo_target = f"output_{target_language}.mp3"
-    final_audio = AudioSegment.silent(duration=0)
+    # En streaming la pista se codifica a medida que se ensambla (ffmpeg arranca con el primer clip)
+    output_filename = f"final_output_{input_file}_{voice_gender}_{repeat}.mp3"
+    final_audio = StreamingTrackWriter(output_filename) if streaming else TrackAssembler()
     line_number = 1
+    language_name = "inglés" if target_language == "en" else "español"
+    repeticiones = 2 if repeat == "twice" else 1
 
     print(
         f"🎤 Voz china por defecto: {'masculina' if voice_gender == 'hombre' else 'femenina'}"
     )
     print(f"📁 Modo: {'Archivos separados por línea' if line_by_line else 'Un archivo final combinado'}")
 
+    # Enviar a síntesis todos los clips del archivo antes de ensamblar nada.
+    # Cada línea queda como una lista de (tarea, veces que suena, mensaje), en el orden de reproducción
+    scheduler = SynthesisScheduler(args.concurrency)
+    plan = []
+
     for line in lines:
         line = line.strip()
         if not line:  # Saltar líneas vacías
             continue
 
-        # Initialize the audio sequence for this line
-        sequence = AudioSegment.silent(duration=0)
+        clips = []
 
         # Verificar si hay separador |
         if "|" in line:
@@ -255,77 +307,29 @@ async def main():
             has_translation = len(parts) >= 4 and parts[3].strip()
             texto_traduccion = parts[3].strip() if has_translation else None
 
-            # Generate target language audio (English/Spanish)
-            await generar_audio_idioma(texto_target, archivo_target, target_language)
-
-            # Generate Mandarin audio for the word with selected voice gender
-            await generar_audio_mandarin(texto_mandarin, archivo_mandarin, voice_gender, voice_rate)
-
-            language_name = "inglés" if target_language == "en" else "español"
-            print(
-                f"✓ Audio creado ({language_name}): '{texto_target}' → {archivo_target}"
-            )
-            print(f"✓ Audio creado (mandarín): '{texto_mandarin}' → {archivo_mandarin}")
-
-            # Load the generated audios
-            audio_target = AudioSegment.from_mp3(archivo_target)
-            audio_mandarin = AudioSegment.from_mp3(archivo_mandarin)
-
-            # Build the audio sequence
-            if repeat == "twice":
-                sequence = (
-                    audio_target
-                    + AudioSegment.silent(duration=1500)
-                    + audio_mandarin
-                    + AudioSegment.silent(duration=1500)
-                    + audio_mandarin
-                )
-            else:
-                sequence = (
-                    audio_target + AudioSegment.silent(duration=1500) + audio_mandarin
-                )
+            # Target language audio (English/Spanish) once, then the Mandarin word with selected voice gender
+            clips.append((
+                scheduler.submit(generar_audio_idioma, texto_target, idioma=target_language),
+                1, f"✓ Audio creado ({language_name}): '{texto_target}'"
+            ))
+            clips.append((
+                scheduler.submit(generar_audio_mandarin, texto_mandarin, voz_genero=voice_gender, rate=voice_rate),
+                repeticiones, f"✓ Audio creado (mandarín): '{texto_mandarin}'"
+            ))
 
             # Add example if it exists
             if has_example:
-                archivo_ejemplo = "output_ejemplo.mp3"
-                await generar_audio_mandarin(
-                    texto_ejemplo, archivo_ejemplo, voice_gender
-                )
-                audio_ejemplo = AudioSegment.from_mp3(archivo_ejemplo)
-                if repeat == "twice":
-                    sequence += (
-                        AudioSegment.silent(duration=1500)
-                        + audio_ejemplo
-                        + AudioSegment.silent(duration=1500)
-                        + audio_ejemplo
-                    )
-                else:
-                    sequence += AudioSegment.silent(duration=1500) + audio_ejemplo
-                print(
-                    f"✓ Audio creado (ejemplo): '{texto_ejemplo}' → {archivo_ejemplo}"
-                )
+                clips.append((
+                    scheduler.submit(generar_audio_mandarin, texto_ejemplo, voz_genero=voice_gender),
+                    repeticiones, f"✓ Audio creado (ejemplo): '{texto_ejemplo}'"
+                ))
 
                 # Add translation of example if it exists
                 if has_translation:
-                    archivo_traduccion = f"output_traduccion_{target_language}.mp3"
-                    await generar_audio_idioma(
-                        texto_traduccion, archivo_traduccion, target_language
-                    )
-                    audio_traduccion = AudioSegment.from_mp3(archivo_traduccion)
-                    if repeat == "twice":
-                        sequence += (
-                            AudioSegment.silent(duration=1500)
-                            + audio_traduccion
-                            + AudioSegment.silent(duration=1500)
-                            + audio_traduccion
-                        )
-                    else:
-                        sequence += (
-                            AudioSegment.silent(duration=1500) + audio_traduccion
-                        )
-                    print(
-                        f"✓ Audio creado (traducción): '{texto_traduccion}' → {archivo_traduccion}"
-                    )
+                    clips.append((
+                        scheduler.submit(generar_audio_idioma, texto_traduccion, idioma=target_language),
+                        repeticiones, f"✓ Audio creado (traducción): '{texto_traduccion}'"
+                    ))
 
         else:
             # Modo solo chino: buscar patrón de personaje
@@ -340,7 +344,6 @@ async def main():
                 if character_name in voice_assignments:
                     voz_especifica = voice_assignments[character_name]
                     gender_str = "masculina" if voz_especifica in MALE_VOICES else "femenina"
-                    print(f"🎭 {character_name} (voz {gender_str}): '{texto_mandarin}'")
                 else:
                     # Usar voz por defecto si el personaje no está asignado
                     if voice_gender == "hombre":
@@ -349,59 +352,75 @@ async def main():
                     else:
                         voz_especifica = FEMALE_VOICES[0]
                         gender_str = "femenina por defecto"
-                    print(f"🎭 {character_name} (voz {gender_str}): '{texto_mandarin}'")
                 
-                # Generate Mandarin audio with the specific voice
-                await generar_audio_chino(texto_mandarin, archivo_mandarin, voz_especifica, voice_rate)
+                # Mandarin audio with the specific voice
+                tarea = scheduler.submit(generar_audio_chino, texto_mandarin, voz=voz_especifica, velocidad=voice_rate)
+                mensaje = f"🎭 {character_name} (voz {gender_str}): '{texto_mandarin}'"
                 
             else:
                 # Línea sin personaje: usar lógica original (A: B:) o texto directo
                 if line.startswith("A:"):
                     texto_mandarin = line[2:].strip()
-                    voz_dialogo = "mujer"
-                    print(f"🎭 Diálogo A (voz femenina): '{texto_mandarin}'")
-                    await generar_audio_mandarin(texto_mandarin, archivo_mandarin, voz_dialogo)
+                    tarea = scheduler.submit(generar_audio_mandarin, texto_mandarin, voz_genero="mujer")
+                    mensaje = f"🎭 Diálogo A (voz femenina): '{texto_mandarin}'"
                 elif line.startswith("B:"):
                     texto_mandarin = line[2:].strip()
-                    voz_dialogo = "hombre"
-                    print(f"🎭 Diálogo B (voz masculina): '{texto_mandarin}'")
-                    await generar_audio_mandarin(texto_mandarin, archivo_mandarin, voz_dialogo)
+                    tarea = scheduler.submit(generar_audio_mandarin, texto_mandarin, voz_genero="hombre")
+                    mensaje = f"🎭 Diálogo B (voz masculina): '{texto_mandarin}'"
                 else:
                     # Texto directo sin personaje
                     texto_mandarin = line
-                    await generar_audio_mandarin(texto_mandarin, archivo_mandarin, voice_gender)
-                    print(f"✓ Audio creado (solo mandarín): '{texto_mandarin}' → {archivo_mandarin}")
-
-            # Load the generated audio
-            audio_mandarin = AudioSegment.from_mp3(archivo_mandarin)
+                    tarea = scheduler.submit(generar_audio_mandarin, texto_mandarin, voz_genero=voice_gender)
+                    mensaje = f"✓ Audio creado (solo mandarín): '{texto_mandarin}'"
 
             # Add the audio once or twice with pause in between for repetition
-            if repeat == "twice":
-                sequence = (
-                    audio_mandarin + AudioSegment.silent(duration=1500) + audio_mandarin
-                )
-            else:
-                sequence = audio_mandarin
+            clips.append((tarea, repeticiones, mensaje))
+
+        plan.append(clips)
+
+    print(f"⏳ {sum(len(clips) for clips in plan)} clips en síntesis ({args.concurrency} a la vez)")
+
+    # Ensamblar en el orden de la entrada a medida que terminan los clips de cada línea
+    audios = decode_in_order(tarea for clips in plan for tarea, _, _ in clips)
+    for clips in plan:
+        # En streaming cada clip se codifica al añadirlo; si no, se guarda por referencia y la pista se copia una sola vez al exportar
+        sequence = TrackAssembler() if line_by_line else final_audio
+        primero = True
+        for _, veces, mensaje in clips:
+            audio = await anext(audios)
+            print(mensaje)
+            for _ in range(veces):
+                if not primero:
+                    sequence.add_silence(PAUSA_REPETICION)
+                sequence.add(audio)
+                primero = False
 
         # Handle line-by-line or combined output
         if line_by_line:
             # Save this line as a separate file
             line_filename = f"{line_number}.mp3"
-            sequence.export(line_filename, format="mp3")
+            sequence.render().export(line_filename, format="mp3")
             print(f"✓ Línea {line_number} guardada: '{line_filename}'")
             line_number += 1
         else:
             # Add to final audio with longer pause between entries
-            final_audio += sequence + AudioSegment.silent(duration=2500)
+            final_audio.add_silence(PAUSA_LINEA)
 
     # Save the final combined audio if not in line-by-line mode
     if not line_by_line:
-        output_filename = f"final_output_{input_file}_{voice_gender}_{repeat}.mp3"
-        final_audio.export(output_filename, format="mp3")
+        if streaming:
+            final_audio.close()
+        else:
+            final_audio.render().export(output_filename, format="mp3")
         print(f"✓ Audio final con pausas creado: '{output_filename}'")
     
     print(f"🎤 Voz por defecto utilizada: {'masculina' if voice_gender == 'hombre' else 'femenina'}")
     print(f"🔁 Repetición: {'una vez' if repeat == 'once' else 'dos veces'}")
+
+    cache = get_tts_cache()
+    if cache:
+        usage = cache.usage()
+        print(f"💾 Caché de voz: {usage['hits']} clips reutilizados, {usage['misses']} sintetizados")
     
     if voice_assignments:
         print("\n🎭 Resumen de voces utilizadas:")